@@ -0,0 +1,209 @@
+import copy
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Services that share a single API (Amazon VPC calls are Amazon EC2 API calls), and therefore a single cache namespace.
+NAMESPACES = {
+    'vpc': 'ec2',
+}
+
+# Read operations whose results are cached, by operation name prefix.
+READ_OPERATIONS = ('get_all_', 'describe_', 'get_image')
+
+# Write operations that do not follow the <verb>_<resource type> naming convention, and the resource types they affect.
+WRITE_OPERATIONS = {
+    'create_vpc':                                 ['vpc', 'security_group', 'route_table', 'network_acl', 'dhcp_options'],
+    'delete_subnet':                              ['subnet', 'route_table'],
+    'create_route':                               ['route_table'],
+    'associate_route_table':                      ['route_table'],
+    'replace_route_table_association_with_assoc': ['route_table'],
+    'attach_internet_gateway':                    ['internet_gateway'],
+    'authorize_security_group':                   ['security_group'],
+    'authorize_security_group_egress':            ['security_group'],
+    'revoke_security_group_egress':               ['security_group'],
+    'run_instances':                              ['instance', 'network_interface'],
+    'terminate_instances':                        ['instance', 'network_interface'],
+    'modify_instance_attribute':                  ['instance'],
+    'create_db_instance':                         ['db_instance'],
+    'register_instances':                         ['load_balancer'],
+    'deregister_instances':                       ['load_balancer'],
+    'create_load_balancer_listeners':             ['load_balancer'],
+    'delete_load_balancer_listeners':             ['load_balancer'],
+    'get_status':                                 None, # A generic request (e.g., AuthorizeSecurityGroupIngress) may modify anything.
+}
+
+# Resource types by resource ID prefix, used to scope invalidation for tagging operations.
+ID_PREFIXES = {
+    'vpc':  'vpc',
+    'subnet': 'subnet',
+    'sg':   'security_group',
+    'rtb':  'route_table',
+    'igw':  'internet_gateway',
+    'i':    'instance',
+    'eni':  'network_interface',
+    'ami':  'image',
+}
+
+# Operations that neither read nor modify resources.
+NEUTRAL_OPERATIONS = ('get_', 'list_', 'lookup', 'make_request', 'build_')
+
+def get_resource_type(operation):
+    # Derive a resource type from an operation name (e.g., get_all_route_tables -> route_table).
+    for prefix in ('get_all_', 'describe_', 'create_', 'delete_', 'get_'):
+        if operation.startswith(prefix):
+            resource_type = operation[len(prefix):]
+            break
+    else:
+        return None
+
+    if resource_type in ('reservations', 'instances'):
+        return 'instance'
+    if resource_type.endswith('s') and not resource_type.endswith('options'):
+        resource_type = resource_type[:-1]
+    return resource_type
+
+def get_tagged_types(resource_ids):
+    # Get the resource types of a list of resource IDs, or None if any of them is unknown.
+    if isinstance(resource_ids, str):
+        resource_ids = [resource_ids]
+    resource_types = set()
+    for resource_id in resource_ids or [None]:
+        resource_type = ID_PREFIXES.get(str(resource_id).split('-', 1)[0])
+        if resource_type is None:
+            return None
+        resource_types.add(resource_type)
+    return sorted(resource_types)
+
+def freeze(value):
+    # Convert arguments into a hashable cache key.
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(freeze(item) for item in value))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    return repr(value)
+
+class DescribeCache(object):
+    """
+    A per-run, thread-safe, read-through cache for AWS describe calls, keyed on
+    the operation and its arguments (e.g., filters).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.statistics = Counter()
+        self.generations = Counter() # Invalidations per (namespace, resource type), and per namespace.
+
+    def get(self, namespace, operation, args, kwargs, loader):
+        resource_type = get_resource_type(operation)
+        key = (namespace, resource_type, operation, freeze(args), freeze(kwargs))
+
+        with self.lock:
+            if key in self.entries:
+                self.statistics['hits'] += 1
+                return list(self.entries[key]) if isinstance(self.entries[key], list) else self.entries[key]
+            self.statistics['misses'] += 1
+            generation = self.get_generation(namespace, resource_type)
+
+        result = loader()
+
+        # Don't cache a result that a concurrent write may have made stale while it loaded.
+        with self.lock:
+            if self.get_generation(namespace, resource_type) == generation:
+                self.entries[key] = result
+        return list(result) if isinstance(result, list) else result
+
+    def get_generation(self, namespace, resource_type):
+        return (self.generations[(namespace, resource_type)], self.generations[(namespace, None)])
+
+    def invalidate(self, namespace, resource_types=None):
+        # Discard cached results for the given resource types, or for the whole namespace.
+        with self.lock:
+            for resource_type in resource_types or [None]:
+                self.generations[(namespace, resource_type)] += 1
+            stale = [key for key in self.entries if key[0] == namespace and (resource_types is None or key[1] in resource_types)]
+            for key in stale:
+                del self.entries[key]
+            self.statistics['invalidations'] += len(stale)
+
+        if stale:
+            logger.debug('Invalidated %d cached %s result(s) for (%s).' % (len(stale), namespace.upper(),
+                                                                          ', '.join(resource_types) if resource_types else 'all resources'))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.statistics.clear()
+
+describe_cache = DescribeCache()
+
+def bind(result, connection):
+    # Serve boto objects that another thread loaded as copies bound to the caller's connection, so that their methods
+    # (e.g., update()) don't share another thread's connection. Lists of boto objects (e.g., a reservation's instances)
+    # are bound, too.
+    if isinstance(result, list):
+        return [bind(item, connection) for item in result]
+    if getattr(result, 'connection', connection) is connection:
+        return result
+
+    result = copy.copy(result)
+    result.connection = connection
+    for attribute, value in list(vars(result).items()):
+        if isinstance(value, list) and any(hasattr(item, 'connection') for item in value):
+            setattr(result, attribute, bind(value, connection))
+    return result
+
+class CachedConnection(object):
+    """
+    Wraps a boto connection, serving describe calls from a
+    :class:`DescribeCache` and invalidating the affected resource types when
+    resources are created, modified or deleted.
+    """
+
+    def __init__(self, connection, service, cache=describe_cache):
+        self.uncached = connection
+        self.namespace = NAMESPACES.get(service, service)
+        self.cache = cache
+
+    def __getattr__(self, operation):
+        attribute = getattr(self.uncached, operation)
+        if not callable(attribute) or operation.startswith('_'):
+            return attribute
+
+        if operation.startswith(READ_OPERATIONS):
+            def read(*args, **kwargs):
+                return bind(self.cache.get(self.namespace, operation, args, kwargs, lambda: attribute(*args, **kwargs)), self.uncached)
+            return read
+
+        if operation.startswith(NEUTRAL_OPERATIONS) and operation not in WRITE_OPERATIONS:
+            return attribute
+
+        def write(*args, **kwargs):
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                # Tagging only affects the types of the tagged resources, which are identified by their ID prefix.
+                if operation in ('create_tags', 'delete_tags'):
+                    self.cache.invalidate(self.namespace, get_tagged_types(args[0] if args else kwargs.get('resource_ids')))
+                elif operation in WRITE_OPERATIONS:
+                    self.cache.invalidate(self.namespace, WRITE_OPERATIONS[operation])
+                elif get_resource_type(operation):
+                    self.cache.invalidate(self.namespace, [get_resource_type(operation)])
+                else:
+                    self.cache.invalidate(self.namespace)
+        return write
+
+def uncached(connection):
+    # Get the underlying connection, for polling calls whose results are expected to change.
+    return getattr(connection, 'uncached', connection)
+
+def get_cache_statistics():
+    with describe_cache.lock:
+        return dict(describe_cache.statistics)
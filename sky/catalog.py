@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import logging
+import threading
+from .state import config
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION = 1
+
+DEFAULT_REGION = 'us-east-1'
+
+# How long catalog entries stay fresh, in seconds, by kind.
+TTL = {
+    'nat_image':      7 * 24 * 60 * 60,  # Amazon publishes new NAT AMIs a few times a year.
+    'image':          30 * 24 * 60 * 60, # AMIs are immutable, but may be deregistered.
+    'zones':          24 * 60 * 60,
+    'closest_region': 24 * 60 * 60,
+}
+
+_lock = threading.RLock()
+_catalog = None
+
+class Record(object):
+    """
+    A cataloged resource, exposing the recorded attributes of a boto object
+    (e.g., an :class:`boto.ec2.image.Image`'s ``id`` and ``name``).
+    """
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+    def __repr__(self):
+        return 'Record:' + str(getattr(self, 'id', None) or getattr(self, 'name', None))
+
+def get_catalog_path():
+    # Keep the catalog alongside the deployment state.
+    return os.path.join(os.getcwd(), '.sky', 'catalog.json')
+
+def get_region(connection):
+    # Get the region name of a (possibly cached) boto connection.
+    connection = getattr(connection, 'uncached', connection)
+    return getattr(getattr(connection, 'region', None), 'name', None) or DEFAULT_REGION
+
+def get_ttl(kind):
+    # A TTL given on the command line applies to every kind of entry.
+    return config.get('CATALOG_TTL') if config.get('CATALOG_TTL') is not None else TTL[kind]
+
+def load_catalog(path=None):
+    global _catalog
+
+    with _lock:
+        if _catalog is None or path:
+            path = path or get_catalog_path()
+            try:
+                with open(path, 'r') as catalog_file:
+                    _catalog = json.load(catalog_file)
+            except FileNotFoundError:
+                _catalog = {}
+            except ValueError as error:
+                logger.error('Ignoring unreadable catalog (%s): %s' % (path, error))
+                _catalog = {}
+
+            if _catalog.get('version') != CATALOG_VERSION:
+                _catalog = {'version': CATALOG_VERSION, 'regions': {}}
+        return _catalog
+
+def save_catalog(path=None):
+    path = path or get_catalog_path()
+
+    with _lock:
+        catalog = load_catalog()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w') as catalog_file:
+            json.dump(catalog, catalog_file, indent=2, sort_keys=True)
+        os.replace(temporary_path, path)
+
+def lookup(kind, key, region, loader):
+    """
+    Get a slow-changing value (e.g., an AMI or a region's Availability Zones)
+    from the catalog, calling ``loader`` and recording its result when the
+    entry is missing or older than its TTL.
+
+    :type loader: callable
+    :param loader: A callable that takes no arguments and returns a
+        JSON-serializable value, or ``None`` if there is nothing to record.
+    """
+    entry_key = '%s:%s' % (kind, key)
+    with _lock:
+        entry = load_catalog()['regions'].get(region, {}).get(entry_key)
+        if entry and time.time() - entry['time'] < get_ttl(kind):
+            logger.debug('Found (%s) in the %s catalog.' % (entry_key, region))
+            return entry['value']
+
+    value = loader()
+
+    # Dry runs read the catalog, but don't record results from the in-memory provider.
+    if value is not None and not config['DRY_RUN']:
+        with _lock:
+            load_catalog()['regions'].setdefault(region, {})[entry_key] = {'time': time.time(), 'value': value}
+            save_catalog()
+        logger.debug('Recorded (%s) in the %s catalog.' % (entry_key, region))
+    return value
+
+def clear(region=None):
+    # Discard the entries of one region, or of all regions.
+    with _lock:
+        catalog = load_catalog()
+        if region:
+            catalog['regions'].pop(region, None)
+        else:
+            catalog['regions'].clear()
+
+def refresh_catalog(region=None):
+    """
+    Discard a region's catalog entries and look up the NAT AMIs, the
+    Availability Zones and the previously cataloged AMIs again.
+    """
+    # Defer import to resolve interdependency between .catalog and .compute modules.
+    from .compute import connect_ec2, get_nat_image, get_image
+
+    ec2_connection = connect_ec2(region)
+    region = region or get_region(ec2_connection)
+
+    with _lock:
+        image_ids = [entry_key.split(':', 1)[1] for entry_key in load_catalog()['regions'].get(region, {}) if entry_key.startswith('image:')]
+        clear(region)
+        if not config['DRY_RUN']:
+            save_catalog()
+
+    logger.info('Refreshing the %s catalog.' % region)
+    get_nat_image(paravirtual=False)
+    get_nat_image(paravirtual=True)
+    get_zones(ec2_connection)
+    for image_id in image_ids:
+        get_image(image_id)
+    logger.info('Refreshed the %s catalog.' % region)
+
+def get_zones(ec2_connection, zones=None):
+    """
+    Get a region's Availability Zones, or the named Availability Zones, from
+    the catalog.
+    """
+    zone_names = lookup('zones', 'all', get_region(ec2_connection),
+                        lambda: [zone.name for zone in ec2_connection.get_all_zones() if zone.state == 'available'])
+
+    # Let Amazon EC2 report zones that are not in the catalog.
+    if zones and not set(zones) <= set(zone_names):
+        return ec2_connection.get_all_zones(zones)
+
+    return [Record(name=zone_name, state='available') for zone_name in (zones or zone_names)]
@@ -1,26 +1,36 @@
-import re
 import time
 import random
 import logging
-from operator import itemgetter
+from collections import OrderedDict
+from concurrent.futures import as_completed
 import boto
+import boto.ec2.networkinterface
+import boto.ec2.securitygroup
 from .networking import connect_vpc, create_route_table
+from .connections import get_connection
 from .state import config, mode
+from .deployment import find_resources
+from .waiter import retry, wait_until, WaitTimeout, TIMEOUT
+from .cache import uncached
+from . import catalog
+from .rules import parse_rules, compact_rules, resolve_groups, apply_rules
+from .scheduler import ContextThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
-def connect_ec2():
+def connect_ec2(region=None):
     """
     Connect to the Amazon Elastic Compute Cloud (Amazon EC2) service.
     """
-    logger.debug('Connecting to the Amazon Elastic Compute Cloud (Amazon EC2) service.')
-    ec2 = boto.connect_ec2(aws_access_key_id=config['AWS_ACCESS_KEY_ID'],
-                           aws_secret_access_key=config['AWS_SECRET_ACCESS_KEY'])
-    logger.debug('Connected to Amazon EC2.')
+    return get_connection('ec2', region)
 
-    return ec2
+def connect_elb(region=None):
+    """
+    Connect to the Amazon EC2 Load Balancing (Amazon ELB) service.
+    """
+    return get_connection('elb', region)
 
-def create_security_group(vpc, name=None, database_backend=None, allowed_inbound_traffic=[], allowed_outbound_traffic=[]):
+def create_security_group(vpc, name=None, database_backend=None, allowed_inbound_traffic=[], allowed_outbound_traffic=[], revoke=False):
     """
     Create an Amazon EC2-VPC Security Group.
 
@@ -78,6 +88,12 @@ def create_security_group(vpc, name=None, database_backend=None, allowed_inbound
 
             * A :class:`boto.ec2.securitygroup.SecurityGroup` that is allowed egress from the created security group.
 
+    :type revoke: bool
+    :param revoke: Whether to revoke the rules of an existing security group
+        that aren't allowed by ``allowed_inbound_traffic`` and
+        ``allowed_outbound_traffic`` (e.g., rules added by hand). By default,
+        an existing security group's rules are only added to.
+
     :rtype: :class:`boto.ec2.securitygroup.SecurityGroup`
     :return: An Amazon EC2-VPC Security Group.
     """
@@ -92,87 +108,56 @@ def create_security_group(vpc, name=None, database_backend=None, allowed_inbound
     if not name:
         name = '-'.join(['gp', config['PROJECT_NAME'], config['ENVIRONMENT']])
 
-    # Check for existing Security Group.
+    # Copy traffic rules, so that neither the caller's lists nor the default arguments are modified.
+    allowed_inbound_traffic = list(allowed_inbound_traffic or [])
+    allowed_outbound_traffic = list(allowed_outbound_traffic or [])
+
+    if database_backend:
+        allowed_outbound_traffic.append(('TCP:%d' % INBOUND_PORT[database_backend], '0.0.0.0/0'))
+
+    # Parse and compact traffic rules, verifying all referenced Security Groups with a single describe call.
+    inbound_rules = parse_rules(allowed_inbound_traffic)
+    outbound_rules = parse_rules(allowed_outbound_traffic)
+    resolve_groups(ec2_connection, inbound_rules + outbound_rules)
+
+    for (direction, rules) in [('inbound', inbound_rules), ('outbound', outbound_rules)]:
+        compacted = compact_rules(rules)
+        if len(compacted) < len(rules):
+            logger.info('Compacted Security Group (%s) %s rules from %d to %d.' % (name, direction, len(rules), len(compacted)))
+        rules[:] = compacted
+
+    # Check for existing Security Group, preferring resources recorded by the previous run.
     if config['CREATION_MODE'] == mode.PERMANENT:
         try:
-            existing_security_group = ec2_connection.get_all_security_groups(filters={'group-name': name,})
+            existing_security_group = find_resources('security_group', name=name, vpc_id=vpc.id) or \
+                                      ec2_connection.get_all_security_groups(filters={'group-name': name,})
             if len(existing_security_group):
                 logger.info('Found existing Security Group (%s).' % name)
+
+                # Apply only the rules that are missing since the previous run.
+                apply_rules(ec2_connection, existing_security_group[-1], inbound_rules, outbound_rules, revoke=revoke)
                 return existing_security_group[-1]
         except boto.exception.EC2ResponseError as error:
             if error.code == 'InvalidGroup.NotFound': # The requested Security Group doesn't exist.
                 pass
 
-    if database_backend:
-        allowed_outbound_traffic.append(('TCP:%d' % INBOUND_PORT[database_backend], '0.0.0.0/0'))
-
     # Create Security Group.
     logger.info('Creating Security Group (%s).' % name)
     security_group = ec2_connection.create_security_group(name, 'Security Group Description', vpc_id=vpc.id)
     logger.info('Created Security Group (%s).' % name)
 
-    # Set up inbound/outbound rules.
-    ec2_connection.revoke_security_group_egress(security_group.id, -1, from_port=0, to_port=65535, cidr_ip='0.0.0.0/0')
-    for (protocol, target, rule_type) in [(traffic[0].upper(), traffic[1], 'inbound') for traffic in allowed_inbound_traffic] + \
-                                         [(traffic[0].upper(), traffic[1], 'outbound') for traffic in allowed_outbound_traffic]:
-
-        # Determine whether target is a CIDR block or a Security Group.
-        is_cidr_ip = re.search('^(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.'+      # A in A.B.C.D
-                               '(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.' +      # B in A.B.C.D
-                               '(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.' +      # C in A.B.C.D
-                               '(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)'   +      # D in A.B.C.D
-                               '(/(([1-2]?[0-9])|(3[0-2])))$', str(target)) # /0 through /32
-        target_cidr_ip = target if is_cidr_ip else None
-        target_group = ec2_connection.get_all_security_groups(group_ids=[target])[-1] if not is_cidr_ip else None
-
-        # Determine port range for TCP and UDP rules.
-        port = None
-        if protocol[:3] in ['TCP', 'UDP']:
-            protocol, port = itemgetter(0, 1)(protocol.split(':'))
-            if re.search(r'^\d+\-\d+$', port):
-                from_port, to_port = itemgetter(0, 1)(port.split('-'))
-            else:
-                from_port, to_port = port, port
-
-        # Create inbound rules.
-        if rule_type == 'inbound':
-            if protocol == 'HTTP':
-                security_group.authorize(ip_protocol='tcp', from_port=80, to_port=80, src_group=target_group, cidr_ip=target_cidr_ip)
-            elif protocol == 'HTTPS':
-                security_group.authorize(ip_protocol='tcp', from_port=443, to_port=443, src_group=target_group, cidr_ip=target_cidr_ip)
-            elif protocol == 'TCP':
-                security_group.authorize(ip_protocol='tcp', from_port=int(from_port), to_port=int(to_port), src_group=target_group, cidr_ip=target_cidr_ip)
-            elif protocol == 'UDP':
-                security_group.authorize(ip_protocol='udp', from_port=int(from_port), to_port=int(to_port), src_group=target_group, cidr_ip=target_cidr_ip)
-            logger.info('Security Group (%s) allowed inbound %s traffic from %s.' % (name, protocol + (' Port %s' % port if port else ''), target))
-
-        # Create outbound rules.
-        if rule_type == 'outbound':
-            if protocol == 'HTTP':
-                ec2_connection.authorize_security_group_egress(security_group.id, 'tcp', from_port=80, to_port=80, src_group_id=target_group, cidr_ip=target_cidr_ip)
-            elif protocol == 'HTTPS':
-                ec2_connection.authorize_security_group_egress(security_group.id, 'tcp', from_port=443, to_port=443, src_group_id=target_group, cidr_ip=target_cidr_ip)
-            elif protocol == 'DNS':
-                ec2_connection.authorize_security_group_egress(security_group.id, 'tcp', from_port=53, to_port=53, src_group_id=target_group, cidr_ip=target_cidr_ip)
-                ec2_connection.authorize_security_group_egress(security_group.id, 'udp', from_port=53, to_port=53, src_group_id=target_group, cidr_ip=target_cidr_ip)
-            elif protocol == 'TCP':
-                 ec2_connection.authorize_security_group_egress(security_group.id, 'tcp', from_port=int(from_port), to_port=int(to_port), src_group_id=target_group, cidr_ip=target_cidr_ip)
-            elif protocol == 'UDP':
-                 ec2_connection.authorize_security_group_egress(security_group.id, 'udp', from_port=int(from_port), to_port=int(to_port), src_group_id=target_group, cidr_ip=target_cidr_ip)
-            logger.info('Security Group (%s) allowed outbound %s traffic to %s.' % (name, protocol + (' Port %s' % port if port else ''), target))
+    # Set up inbound/outbound rules, replacing the default rule that allows all outbound traffic.
+    if not security_group.rules_egress:
+        security_group.rules_egress = [boto.ec2.securitygroup.IPPermissions()]
+        security_group.rules_egress[0].ip_protocol = '-1'
+        security_group.rules_egress[0].add_grant(cidr_ip='0.0.0.0/0')
+    apply_rules(ec2_connection, security_group, inbound_rules, outbound_rules, revoke=True)
 
     # Tag Security Group.
-    tagged = False
-    while not tagged:
-        try:
-            tagged = ec2_connection.create_tags(security_group.id, {'Name': name,
-                                                                    'Project': config['PROJECT_NAME'],
-                                                                    'Environment': config['ENVIRONMENT'],})
-        except boto.exception.EC2ResponseError as error:
-            if error.code == 'InvalidID': # Security Group hasn't registered with EC2 service yet.
-                pass
-            else:
-                raise boto.exception.EC2ResponseError
+    retry(ec2_connection.create_tags, security_group.id, {'Name': name,
+                                                          'Project': config['PROJECT_NAME'],
+                                                          'Environment': config['ENVIRONMENT'],},
+          retry_on=['InvalidID']) # Security Group hasn't registered with EC2 service yet.
 
     return security_group
 
@@ -207,9 +192,7 @@ def create_load_balancer(subnets, name=None, security_groups=None, ssl_certifica
     :return: An Elastic Load Balancer (ELB).
     """
     # Connect to the Amazon EC2 Load Balancing (Amazon ELB) service.
-    logger.debug('Connecting to the Amazon EC2 Load Balancing (Amazon ELB) service.')
-    elb_connection = boto.connect_elb()
-    logger.debug('Connected to the Amazon EC2 Load Balancing (Amazon ELB) service.')
+    elb_connection = connect_elb()
 
     # Generate Elastic Load Balancer (ELB) name.
     if not name:
@@ -283,31 +266,92 @@ def create_nat_instances(vpc, public_subnets, private_subnets, security_groups=N
 
     subnet_pairs = list(zip(sorted(public_subnets, key=lambda x: x.availability_zone), sorted(private_subnets, key=lambda x: x.availability_zone)))
 
-    # Create NAT instances.
-    nat_instances = list()
-    for (public_subnet, private_subnet) in subnet_pairs:
-        nat_instance = create_nat_instance(vpc, public_subnet, private_subnet, name=None, security_groups=None, image_id=None)
-        nat_instances.append(nat_instance)
+    # Get Amazon Linux VPC NAT AMI once, for all NAT instances.
+    if not image_id:
+        image_id = get_nat_image()
+
+    with ContextThreadPoolExecutor(max_workers=max(1, min(len(subnet_pairs), config['JOBS'] or 1))) as executor:
+        # Launch NAT instances concurrently, collecting results in subnet order.
+        futures = dict((executor.submit(launch_nat_instance, vpc, public_subnet, private_subnet, security_groups=security_groups, image_id=image_id), i) \
+                       for i, (public_subnet, private_subnet) in enumerate(subnet_pairs))
+        launches = [None]*len(subnet_pairs)
+        failure = None
+        for future in as_completed(futures):
+            try:
+                launches[futures[future]] = future.result()
+            except BaseException as error:
+                logger.error('Couldn\'t launch NAT instance in (%s).' % subnet_pairs[futures[future]][0].availability_zone)
+                failure = failure or error
+
+        if failure:
+            # Terminate NAT instances launched by this call and delete their Route Tables, leaving existing NAT instances untouched.
+            launched = [launch for launch in launches if launch and launch[1]]
+            try:
+                terminate_instances([nat_instance for (nat_instance, route_table) in launched])
+            except boto.exception.BotoServerError as error:
+                logger.error('Error %s: %s. Couldn\'t terminate NAT instances.' % (error.status, error.reason))
+            for (nat_instance, route_table) in launched:
+                logger.info('Deleting Route Table (%s).' % route_table.id)
+                try:
+                    connect_vpc().delete_route_table(route_table.id, dry_run=False)
+                except boto.exception.BotoServerError as error:
+                    logger.error('Error %s: %s. Couldn\'t delete Route Table (%s).' % (error.status, error.reason, route_table.id))
+            raise failure
+
+        # Route Tables created for NAT instances must survive each other's clean up until they have been associated.
+        route_table_ids = set([route_table.id for (nat_instance, route_table) in launches if route_table])
+
+        # Route each private subnet through its NAT instance as soon as the NAT instance is running. Existing NAT instances
+        # are already routed.
+        nat_instances = [nat_instance for (nat_instance, route_table) in launches]
+        pending = dict((nat_instance.id, i) for i, (nat_instance, route_table) in enumerate(launches) if route_table)
+        routes = list()
+        while pending:
+            # Poll the state of all pending NAT instances at once.
+            running = wait_until(lambda: get_instance_states(list(pending)),
+                                 condition=lambda nat_instances: [nat_instance for nat_instance in nat_instances if nat_instance.state != 'pending'],
+                                 description='NAT instances (%s) to run' % ', '.join(sorted(pending)),
+                                 retry_on=['InvalidInstanceID.NotFound']) # Instance hasn't registered with EC2 service yet.
+
+            for nat_instance in [nat_instance for nat_instance in running if nat_instance.state != 'pending']:
+                i = pending.pop(nat_instance.id)
+                routes.append(executor.submit(route_nat_instance, vpc, subnet_pairs[i][1], launches[i][0], launches[i][1], keep=route_table_ids))
+
+        for future in routes:
+            future.result()
 
     return nat_instances
 
 def create_nat_instance(vpc, public_subnet, private_subnet, name=None, security_groups=None, image_id=None):
+    # Launch NAT instance.
+    nat_instance, route_table = launch_nat_instance(vpc, public_subnet, private_subnet, name=name, security_groups=security_groups, image_id=image_id)
+    if not route_table:
+        return nat_instance
+
+    # Wait for NAT instance to run.
+    wait_until(nat_instance.update,
+               condition=lambda state: state != 'pending',
+               description='NAT instance (%s) to run' % nat_instance.id,
+               retry_on=['InvalidInstanceID.NotFound'])
+
+    # Route Private Subnet through NAT instance.
+    return route_nat_instance(vpc, private_subnet, nat_instance, route_table)
+
+def launch_nat_instance(vpc, public_subnet, private_subnet, name=None, security_groups=None, image_id=None):
     # Connect to the Amazon Elastic Compute Cloud (Amazon EC2) service.
     ec2_connection = connect_ec2()
 
-    # Connect to the Amazon Virtual Private Cloud (Amazon VPC) service.
-    vpc_connection = connect_vpc()
-
     # Generate name, if one was not specified.
     if not name:
         name = '-'.join(['ec2', config['PROJECT_NAME'], config['ENVIRONMENT'], public_subnet.availability_zone, 'nat'])
 
     # Check for existing NAT Server.
     if config['CREATION_MODE'] == mode.PERMANENT:
-         nat_instances = get_instances(name=name, role='nat')
+         nat_instances = find_resources('instance', tags={'Name': name, 'Role': 'nat'}, state='running') or \
+                         get_instances(name=name, role='nat')
          if len(nat_instances):
              logger.info('Found existing NAT Server (%s).' % name)
-             return nat_instances
+             return (nat_instances[-1], None)
 
     # Create Security Group, if one was not specified.
     if not security_groups:
@@ -326,18 +370,34 @@ def create_nat_instance(vpc, public_subnet, private_subnet, name=None, security_
     # Create NAT Instance.
     nat_instance = create_instance(public_subnet, name=name, role='nat', security_groups=security_groups, image_id=image_id.id, internet_addressable=True)[0]
 
-    # Disable source/destination checking.
-    ec2_connection.modify_instance_attribute(nat_instance.id, attribute='sourceDestCheck', value=False, dry_run=False)
+    try:
+        # Disable source/destination checking.
+        ec2_connection.modify_instance_attribute(nat_instance.id, attribute='sourceDestCheck', value=False, dry_run=False)
+
+        # Create Route table.
+        route_table_name = '-'.join(['rtb', config['PROJECT_NAME'], config['ENVIRONMENT'], public_subnet.availability_zone, 'private'])
+        route_table = create_route_table(vpc, name=route_table_name, internet_access=False)
+    except BaseException:
+        logger.info('Terminating NAT instance (%s).' % nat_instance.id)
+        try:
+            ec2_connection.terminate_instances(instance_ids=[nat_instance.id])
+        except boto.exception.BotoServerError as error:
+            logger.error('Error %s: %s. Couldn\'t terminate NAT instance (%s).' % (error.status, error.reason, nat_instance.id))
+        raise
 
-    # Create Route table.
-    route_table_name = '-'.join(['rtb', config['PROJECT_NAME'], config['ENVIRONMENT'], public_subnet.availability_zone, 'private'])
-    route_table = create_route_table(vpc, name=route_table_name, internet_access=False)
+    return (nat_instance, route_table)
 
-    # Wait for NAT instance to run.
-    while (nat_instance.state == 'pending'):
-        logger.debug('Waiting for NAT instance to run (%s)...' % nat_instance.id)
-        time.sleep(1)
-        nat_instance.update()
+def get_instance_states(instance_ids):
+    # Connect to the Amazon Elastic Compute Cloud (Amazon EC2) service.
+    ec2_connection = connect_ec2()
+
+    # Get the current state of EC2 instances, bypassing the describe cache.
+    reservations = uncached(ec2_connection).get_all_instances(instance_ids=instance_ids)
+    return [instance for reservation in reservations for instance in reservation.instances]
+
+def route_nat_instance(vpc, private_subnet, nat_instance, route_table, keep=()):
+    # Connect to the Amazon Virtual Private Cloud (Amazon VPC) service.
+    vpc_connection = connect_vpc()
 
     # Add route to NAT Instance to Route Table.
     vpc_connection.create_route(route_table.id,    # route_table_id
@@ -367,21 +427,26 @@ def create_nat_instance(vpc, public_subnet, private_subnet, name=None, security_
     else:
         logger.error('Subnet (%s) not associated to (%s).' % (private_subnet.id, route_table.name))
 
-    # Clean up unused/orphaned Route Tables.
+    # Clean up unused/orphaned Route Tables, other than those awaiting association.
     route_tables = vpc_connection.get_all_route_tables(filters={'vpc-id': vpc.id,})
     main_route_table = vpc_connection.get_all_route_tables(filters={'vpc-id': vpc.id,
                                                                     'association.main': 'true'})[0] # Affected by boto Issue #1742 : https://github.com/boto/boto/issues/1742
-    empty_route_tables = [route_table for route_table in route_tables if not len(route_table.associations) and not route_table.id == main_route_table.id]
+    empty_route_tables = [route_table for route_table in route_tables if not len(route_table.associations) and not route_table.id == main_route_table.id \
+                          and route_table.id not in keep]
     for route_table in empty_route_tables:
         try:
             vpc_connection.delete_route_table(route_table.id, dry_run=False)
         except boto.exception.EC2ResponseError as error:
             if error.code == 'DependencyViolation': # Route Table was not actually empty.
                 pass
+            elif error.code == 'InvalidRouteTableID.NotFound': # Route Table was deleted concurrently.
+                pass
+            else:
+                raise
 
     return nat_instance
 
-def create_instances(vpc, subnets, role=None, security_groups=None, script=None, instance_profile=None, os='ubuntu', image_id=None, key_name=None, internet_addressable=False):
+def create_instances(vpc, subnets, role=None, security_groups=None, script=None, instance_profile=None, os='ubuntu', image_id=None, key_name=None, internet_addressable=False, count=1):
     # Create a security group, if a security group was not specified.
     if not security_groups:
         security_groups = [create_security_group(vpc, allowed_inbound_traffic=[('HTTP',   '0.0.0.0/0')
@@ -390,14 +455,28 @@ def create_instances(vpc, subnets, role=None, security_groups=None, script=None,
                                                                                ,('HTTPS', '0.0.0.0/0')
                                                                                ,('DNS',   '0.0.0.0/0')])]
 
-    # Create EC2 instances.
-    instances = list()
-    for subnet in subnets:
-        instance = create_instance(subnet, role=role, security_groups=security_groups, script=script, instance_profile=instance_profile, os=os, image_id=image_id, key_name=key_name, internet_addressable=internet_addressable)
-        instances = instances + instance
-    return instances
+    # Create EC2 instances in each subnet concurrently, collecting results in subnet order.
+    with ContextThreadPoolExecutor(max_workers=max(1, min(len(subnets), config['JOBS'] or 1))) as executor:
+        futures = [executor.submit(create_instance, subnet, role=role, security_groups=security_groups, script=script, instance_profile=instance_profile, os=os,
+                                   image_id=image_id, key_name=key_name, internet_addressable=internet_addressable, count=count, refresh=False) for subnet in subnets]
+        instances = [instance for future in futures for instance in future.result()]
+
+    # Refresh EC2 instance objects for the whole fleet at once.
+    return refresh_instances(instances)
+
+def refresh_instances(instances):
+    # Connect to the Amazon Elastic Compute Cloud (Amazon EC2) service.
+    ec2_connection = connect_ec2()
+
+    if not instances:
+        return []
 
-def create_instance(subnet, name=None, role=None, security_groups=None, script=None, instance_profile=None, os='ubuntu', image_id=None, key_name=None, internet_addressable=False):
+    # Refresh EC2 instance objects, preserving their order.
+    reservations = ec2_connection.get_all_instances(instance_ids=[instance.id for instance in instances])
+    refreshed = dict((instance.id, instance) for reservation in reservations for instance in reservation.instances)
+    return [refreshed.get(instance.id, instance) for instance in instances]
+
+def create_instance(subnet, name=None, role=None, security_groups=None, script=None, instance_profile=None, os='ubuntu', image_id=None, key_name=None, internet_addressable=False, count=1, refresh=True):
     # Set up dictionary of OSes and their associated quick-start Amazon Machine Images (AMIs).
     ami = {
         'amazon-linux': 'ami-146e2a7c',
@@ -411,7 +490,7 @@ def create_instance(subnet, name=None, role=None, security_groups=None, script=N
 
     # Determine whether to use a start-up AMI or a specific AMI.
     if image_id:
-        image = ec2_connection.get_image(image_id)
+        image = get_image(image_id)
         if not image:
             raise RuntimeError('The specified Amazon Machine Image (AMI) could not be found (%s).' % image_id)
     else:
@@ -422,9 +501,6 @@ def create_instance(subnet, name=None, role=None, security_groups=None, script=N
         random_id = '{:08x}'.format(random.randrange(2**32))
         name = '-'.join(['ec2', config['PROJECT_NAME'], config['ENVIRONMENT'], random_id])
 
-    # Generate Elastic Network Interface (ENI) name.
-    eni_name = '-'.join(['eni', name.replace('ec2-', '')])
-
     # Create Elastic Network Interface (ENI) specification.
     interface = boto.ec2.networkinterface.NetworkInterfaceSpecification(subnet_id=subnet.id,
                                                                         groups=[security_group.id for security_group in security_groups],
@@ -432,8 +508,10 @@ def create_instance(subnet, name=None, role=None, security_groups=None, script=N
     interfaces = boto.ec2.networkinterface.NetworkInterfaceCollection(interface)
 
     # Create EC2 Reservation.
-    logger.info('Creating EC2 Instance (%s) in %s.' % (name, subnet.availability_zone))
+    logger.info('Creating EC2 Instance (%s) in %s%s.' % (name, subnet.availability_zone, ' (x%d)' % count if count > 1 else ''))
     reservation = ec2_connection.run_instances(image_id,                 # image_id
+                                               min_count=count,
+                                               max_count=count,
                                                key_name=key_name,
                                                instance_type='t2.micro',
                                                instance_profile_name=instance_profile.name if instance_profile else None,
@@ -444,61 +522,62 @@ def create_instance(subnet, name=None, role=None, security_groups=None, script=N
     # Get EC2 Instances.
     instances = [instances for instances in reservation.instances]
 
+    # Name each EC2 Instance of a multi-instance launch separately, so that the fleet stays distinguishable.
+    names = dict((instance.id, name if len(instances) == 1 else '%s-%d' % (name, index)) for (index, instance) in enumerate(instances))
+
     # Tag EC2 Instances.
-    tagged = False
-    while not tagged:
-        try:
-            tagged = ec2_connection.create_tags([instance.id for instance in instances], {'Name': name,
-                                                                                          'Project': config['PROJECT_NAME'],
-                                                                                          'Environment': config['ENVIRONMENT'],
-                                                                                          'Role': role if role else '',})
-        except boto.exception.EC2ResponseError as error:
-            if error.code == 'InvalidInstanceID.NotFound': # Instance hasn't registered with EC2 service yet.
-                pass
-            else:
-                raise boto.exception.EC2ResponseError
+    for instance in instances:
+        retry(ec2_connection.create_tags, [instance.id], {'Name': names[instance.id],
+                                                          'Project': config['PROJECT_NAME'],
+                                                          'Environment': config['ENVIRONMENT'],
+                                                          'Role': role if role else '',},
+              retry_on=['InvalidInstanceID.NotFound']) # Instance hasn't registered with EC2 service yet.
+
+    # Get Elastic Network Interfaces (ENIs) attached to instances, waiting until every instance has one.
+    interfaces = wait_until(lambda: uncached(ec2_connection).get_all_network_interfaces(filters={'attachment.instance-id': list(names)}),
+                            condition=lambda interfaces: len(interfaces) >= len(instances),
+                            description='ENI attachment to (%s)' % name,
+                            retry_on=['InvalidInstanceID.NotFound']) # Instance hasn't registered with EC2 service yet.
+
+    # Tag Elastic Network Interfaces (ENIs), after the instances they're attached to.
+    for interface in interfaces:
+        eni_name = '-'.join(['eni', names[interface.attachment.instance_id].replace('ec2-', '')])
+        retry(ec2_connection.create_tags, [interface.id], {'Name': eni_name,
+                                                           'Project': config['PROJECT_NAME'],
+                                                           'Environment': config['ENVIRONMENT']},
+              retry_on=['InvalidNetworkInterfaceID.NotFound']) # ENI hasn't registered with EC2 service yet.
 
-    # Get Elastic Network Interface (ENI) attached to instances.
-    interfaces = None
-    while not interfaces:
-        try:
-            interfaces = ec2_connection.get_all_network_interfaces(filters={'attachment.instance-id': [instance.id for instance in instances]})
-        except boto.exception.EC2ResponseError as error:
-            if error.code == 'InvalidInstanceID.NotFound': # Instance hasn't registered with EC2 service yet.
-                pass
-            else:
-                raise boto.exception.EC2ResponseError
+    # Refresh EC2 instance objects.
+    return refresh_instances(instances) if refresh else instances
 
-    # Tag Elastic Network Interface (ENI).
-    tagged = False
-    while not tagged:
-        try:
-            tagged = ec2_connection.create_tags([interface.id for interface in interfaces], {'Name': eni_name,
-                                                                                             'Project': config['PROJECT_NAME'],
-                                                                                             'Environment': config['ENVIRONMENT']})
-        except boto.exception.EC2ResponseError as error:
-            if error.code == 'InvalidNetworkInterfaceID.NotFound': # ENI hasn't registered with EC2 service yet.
-                pass
-            else:
-                raise boto.exception.EC2ResponseError
+def get_nat_image(paravirtual=False):
+    # Connect to the Amazon Elastic Compute Cloud (Amazon EC2) service.
+    ec2_connection = connect_ec2()
 
-    # Refresh EC2 instance objects.
-    reservations = ec2_connection.get_all_instances(instance_ids=[instance.id for instance in instances])
-    instances = [instance for reservation in reservations for instance in reservation.instances]
+    def get_latest_nat_image():
+        # Get paravirtual (PV) or hardware virtual machine (HVM) Amazon Linux VPC NAT AMIs.
+        images = ec2_connection.get_all_images(filters={'owner-alias': 'amazon',
+                                                        'name': 'amzn-ami-vpc-nat-' + ('pv' if paravirtual else 'hvm') + '*',})
 
-    return instances
+        # Return the most recent AMI.
+        image = sorted(images, key=lambda x: x.name.split('-')[5])[-1]
+        return {'id': image.id, 'name': image.name}
 
-def get_nat_image(paravirtual=False):
+    # Look up the AMI in the catalog, since listing NAT AMIs returns a large payload.
+    image = catalog.lookup('nat_image', 'pv' if paravirtual else 'hvm', catalog.get_region(ec2_connection), get_latest_nat_image)
+    return catalog.Record(**image)
+
+def get_image(image_id):
     # Connect to the Amazon Elastic Compute Cloud (Amazon EC2) service.
     ec2_connection = connect_ec2()
 
-    # Get paravirtual (PV) or hardware virtual machine (HVM) Amazon Linux VPC NAT AMIs.
-    images = ec2_connection.get_all_images(filters={'owner-alias': 'amazon',
-                                                    'name': 'amzn-ami-vpc-nat-' + ('pv' if paravirtual else 'hvm') + '*',})
+    def get_image_attributes():
+        image = ec2_connection.get_image(image_id)
+        return {'id': image.id, 'name': image.name} if image else None
 
-    # Return the most recent AMI.
-    image = sorted(images, key=lambda x: x.name.split('-')[5])[-1]
-    return image
+    # Look up the AMI in the catalog.
+    image = catalog.lookup('image', image_id, catalog.get_region(ec2_connection), get_image_attributes)
+    return catalog.Record(**image) if image else None
 
 def run(script, command):
     script += '\n' + command
@@ -510,9 +589,7 @@ def install_package(script, package_name):
 
 def register_instances(load_balancer, instances):
     # Connect to the Amazon EC2 Load Balancing (Amazon ELB) service.
-    logger.debug('Connecting to the Amazon EC2 Load Balancing (Amazon ELB) service.')
-    elb_connection = boto.connect_elb()
-    logger.debug('Connected to the Amazon EC2 Load Balancing (Amazon ELB) service.')
+    elb_connection = connect_elb()
 
     logger.info('Registering (%s) with Load Balancer (%s).' % (', '.join([instance.tags['Name'] for instance in instances]) if len(instances) > 1 \
                                                                else instances[-1].tags['Name'], \
@@ -524,9 +601,7 @@ def register_instances(load_balancer, instances):
 
 def deregister_instances(load_balancer, instances):
     # Connect to the Amazon EC2 Load Balancing (Amazon ELB) service.
-    logger.debug('Connecting to the Amazon EC2 Load Balancing (Amazon ELB) service.')
-    elb_connection = boto.connect_elb()
-    logger.debug('Connected to the Amazon EC2 Load Balancing (Amazon ELB) service.')
+    elb_connection = connect_elb()
 
     logger.info('Deregistering (%s) from Load Balancer (%s).' % (', '.join([instance.tags['Name'] for instance in instances]) if len(instances) > 1 \
                                                                  else instances[-1].tags['Name'], \
@@ -572,7 +647,27 @@ def terminate_instances(instances):
         logger.info('Terminated (%s).' % (', '.join([instance.tags['Name'] for instance in instances]) if len(instances) > 1 \
                                                     else instances[-1].tags['Name']))
 
-def rotate_instances(load_balancer, instances, terminate_outgoing_instances=True):
+def rotate_instances(load_balancer, instances, terminate_outgoing_instances=True, batch_size=None, max_surge=None, timeout=TIMEOUT):
+    """
+    Replace the EC2 instances registered with a Load Balancer by a set of
+    incoming EC2 instances, retiring an outgoing EC2 instance (preferably from
+    the same subnet) for each incoming EC2 instance that comes into service.
+
+    :type batch_size: int
+    :param batch_size: The number of incoming EC2 instances that must come into
+        service before their outgoing EC2 instances are retired together.
+        Defaults to retiring whichever EC2 instances are ready.
+
+    :type max_surge: int
+    :param max_surge: The maximum number of incoming EC2 instances registered
+        with the Load Balancer, but not yet in service. Defaults to all
+        incoming EC2 instances.
+
+    :type timeout: float
+    :param timeout: The number of seconds after which incoming EC2 instances
+        that haven't come into service are deregistered, and
+        :class:`sky.waiter.WaitTimeout` is raised.
+    """
     # Connect to the Amazon Elastic Compute Cloud (Amazon EC2) service.
     ec2_connection = connect_ec2()
 
@@ -580,48 +675,75 @@ def rotate_instances(load_balancer, instances, terminate_outgoing_instances=True
     old_reservations = ec2_connection.get_all_instances(instance_ids=[old_instance.id for old_instance in load_balancer.instances]) if load_balancer.instances else None
     old_instances = [instance for reservation in old_reservations for instance in reservation.instances] if load_balancer.instances else None
 
-    # Register incoming EC2 instances with the Load Balancer.
-    register_instances(load_balancer, instances)
-
-    # Rotate EC2 instances.
-    if old_instances:
-        new_instance_names = ', '.join([instance.tags['Name'] for instance in instances]) if len(instances) > 1 \
-                             else instances[-1].tags['Name']
-        old_instance_names = ', '.join([instance.tags['Name'] for instance in old_instances]) if len(old_instances) > 1 \
-                             else old_instances[-1].tags['Name']
-        logger.info('Rotating incoming EC2 Instances (%s) and outgoing EC2 instances (%s) under Load Balancer (%s).' % (new_instance_names,
-                                                                                                                        old_instance_names,
-                                                                                                                        load_balancer.name))
-        # Determine incoming EC2 instance states with respect to the Load Balancer.
-        instance_states = load_balancer.get_instance_health(instances=[instance.id for instance in instances])
-
-        # Rotate EC2 instances with a new EC2. instance has come into service.
-        while 'OutOfService' in [instance_state.state for instance_state in instance_states]:
-            # Refresh incoming EC2 instance states with respect to the Load Balancer.
-            instance_states = load_balancer.get_instance_health(instances=[instance.id for instance in instances])
-
-            # Terminate outgoing EC2 instance when an incoming EC2 instance has come into service.
-            for instance_id in [instance_state.instance_id for instance_state in instance_states if instance_state.state == 'InService']:
-                # Get incoming instance.
-                instance = next(instance for instance in instances if instance.id == instance_id)
-                logger.info('EC2 Instance (%s) has come into service.' % instance.tags['Name'])
-
-                # Get outgoing EC2 instance.
-                old_instance = next(old_instance for old_instance in old_instances if old_instance.subnet_id == instance.subnet_id)
-
-                # Deregister outgoing EC2 instance from Load Balancer.
-                deregister_instances(load_balancer, [old_instance])
-
-                if terminate_outgoing_instances:
-                    # Terminate outgoing EC2 instance.
-                    terminate_instances([old_instance])
-
-                # Remove incoming EC2 instance from list.
-                instances.remove(instance)
-
-            # Throttle EC2 instance rotation.
-            time.sleep(5)
-
-        logger.info('Rotated incoming EC2 Instances (%s) and outgoing EC2 instances (%s) under Load Balancer (%s).' % (new_instance_names,
-                                                                                                                       old_instance_names,
-                                                                                                                       load_balancer.name))
+    # Register incoming EC2 instances with the Load Balancer, if there is nothing to rotate.
+    if not old_instances:
+        register_instances(load_balancer, instances)
+        return
+
+    new_instance_names = ', '.join([instance.tags['Name'] for instance in instances]) if len(instances) > 1 \
+                         else instances[-1].tags['Name']
+    old_instance_names = ', '.join([instance.tags['Name'] for instance in old_instances]) if len(old_instances) > 1 \
+                         else old_instances[-1].tags['Name']
+    logger.info('Rotating incoming EC2 Instances (%s) and outgoing EC2 instances (%s) under Load Balancer (%s).' % (new_instance_names,
+                                                                                                                    old_instance_names,
+                                                                                                                    load_balancer.name))
+
+    # Index incoming EC2 instances by ID, and outgoing EC2 instances by subnet.
+    unregistered = OrderedDict((instance.id, instance) for instance in instances)
+    registered = OrderedDict()
+    outgoing = OrderedDict()
+    for old_instance in old_instances:
+        outgoing.setdefault(old_instance.subnet_id, []).append(old_instance)
+
+    max_surge = max(1, max_surge or len(instances))
+    deadline = time.monotonic() + timeout
+
+    # Rotate EC2 instances as incoming EC2 instances come into service.
+    while unregistered or registered:
+        # Register as many incoming EC2 instances as the surge allows.
+        batch = [unregistered.popitem(last=False)[1] for i in range(min(len(unregistered), max_surge - len(registered)))]
+        if batch:
+            register_instances(load_balancer, batch)
+            registered.update((instance.id, instance) for instance in batch)
+
+        # Wait for a batch of incoming EC2 instances to come into service with respect to the Load Balancer.
+        required = min(batch_size or 1, len(registered))
+        try:
+            instance_states = wait_until(lambda: load_balancer.get_instance_health(instances=list(registered)),
+                                         condition=lambda states: len([state for state in states if state.state == 'InService']) >= required,
+                                         description='EC2 Instances to come into service under (%s)' % load_balancer.name,
+                                         delay=1,
+                                         timeout=max(0, deadline - time.monotonic()))
+        except WaitTimeout:
+            # Roll back incoming EC2 instances that haven't come into service, leaving outgoing EC2 instances in service.
+            logger.error('EC2 Instances (%s) did not come into service under (%s).' % (', '.join(registered), load_balancer.name))
+            deregister_instances(load_balancer, list(registered.values()))
+            raise
+
+        # Match each incoming EC2 instance to an outgoing EC2 instance, preferably in the same subnet.
+        retiring = list()
+        for instance_id in [instance_state.instance_id for instance_state in instance_states if instance_state.state == 'InService']:
+            instance = registered.pop(instance_id, None)
+            if not instance:
+                continue
+            logger.info('EC2 Instance (%s) has come into service.' % instance.tags['Name'])
+            candidates = outgoing.get(instance.subnet_id) or next((candidates for candidates in outgoing.values() if candidates), None)
+            if candidates:
+                retiring.append(candidates.pop(0))
+
+        if retiring:
+            # Deregister outgoing EC2 instances from Load Balancer.
+            deregister_instances(load_balancer, retiring)
+
+            if terminate_outgoing_instances:
+                # Terminate outgoing EC2 instances.
+                terminate_instances(retiring)
+
+    remaining = [old_instance for candidates in outgoing.values() for old_instance in candidates]
+    if remaining:
+        logger.warning('Outgoing EC2 Instances (%s) remain in service under Load Balancer (%s).' % (', '.join([instance.tags['Name'] for instance in remaining]),
+                                                                                                   load_balancer.name))
+
+    logger.info('Rotated incoming EC2 Instances (%s) and outgoing EC2 instances (%s) under Load Balancer (%s).' % (new_instance_names,
+                                                                                                                   old_instance_names,
+                                                                                                                   load_balancer.name))
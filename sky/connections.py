@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+import boto
+import boto.s3.connection
+from .cache import CachedConnection
+from .state import config
+
+logger = logging.getLogger(__name__)
+
+# Service names, descriptions and the boto functions that connect to them.
+SERVICES = {
+    'ec2': ('Amazon Elastic Compute Cloud (Amazon EC2)',       'connect_ec2',  'boto.ec2'),
+    'vpc': ('Amazon Virtual Private Cloud (Amazon VPC)',       'connect_vpc',  'boto.vpc'),
+    'rds': ('Amazon Relational Database Service (Amazon RDS)', 'connect_rds2', 'boto.rds2'),
+    'iam': ('Amazon Identity and Access Management (Amazon IAM)', 'connect_iam', 'boto.iam'),
+    's3':  ('Amazon Simple Storage Service (Amazon S3)',       'connect_s3',   'boto.s3'),
+    'elb': ('Amazon EC2 Load Balancing (Amazon ELB)',          'connect_elb',  'boto.ec2.elb'),
+}
+
+# Connections are kept per thread, since boto connections are not thread-safe.
+_local = threading.local()
+
+# Connections of threads that have exited (e.g., the workers of a finished thread pool), by key, for new threads to adopt.
+_idle = {}
+
+_statistics_lock = threading.Lock()
+statistics = Counter()
+
+class ThreadConnections(dict):
+    """
+    A thread's connections, by key. When the thread exits, its connections are
+    returned to the idle connections, so that they outlive short-lived thread
+    pools while each is still used by one thread at a time.
+    """
+
+    def __del__(self):
+        with _statistics_lock:
+            for key, connection in self.items():
+                _idle.setdefault(key, []).append(connection)
+
+def get_connection(service, region=None):
+    """
+    Get a connection to an AWS service, reusing the current thread's
+    connection for the same service, region and credentials, if one exists,
+    or else a connection left behind by a thread that has exited.
+
+    :type service: string
+    :param service: One of ``ec2``, ``vpc``, ``rds``, ``iam``, ``s3`` or ``elb``.
+
+    :type region: string
+    :param region: An *optional* region name (e.g., ``us-east-1``). boto's
+        default region is used, if one is not specified.
+    """
+    secret_digest = hashlib.sha256((config['AWS_SECRET_ACCESS_KEY'] or '').encode('utf-8')).hexdigest()
+    key = (service, region, config['AWS_ACCESS_KEY_ID'], secret_digest, bool(config['DRY_RUN']))
+
+    connections = _local.__dict__.setdefault('connections', ThreadConnections())
+    if key in connections:
+        with _statistics_lock:
+            statistics['reused'] += 1
+        return connections[key]
+
+    # Adopt an idle connection, if there is one.
+    with _statistics_lock:
+        idle = _idle.get(key)
+        connection = idle.pop() if idle else None
+        statistics['adopted' if connection else 'created'] += 1
+
+    # Serve describe calls from the per-run cache.
+    connections[key] = connection or CachedConnection(create_connection(service, region), service)
+
+    return connections[key]
+
+def create_connection(service, region=None):
+    # Use the in-memory provider during dry runs.
+    if config['DRY_RUN']:
+        from .mock import connect
+        return connect(service)
+
+    description, connect_function, module_name = SERVICES[service]
+    logger.debug('Connecting to the %s service%s.' % (description, ' in %s' % region if region else ''))
+
+    credentials = {
+        'aws_access_key_id':     config['AWS_ACCESS_KEY_ID'],
+        'aws_secret_access_key': config['AWS_SECRET_ACCESS_KEY'],
+    }
+    if service == 's3' and config.get('S3_ENDPOINT'):
+        # Connect to an S3-compatible endpoint (e.g., http://127.0.0.1:9000) instead of Amazon S3.
+        endpoint = urlsplit(config['S3_ENDPOINT'])
+        connection = boto.s3.connection.S3Connection(host=endpoint.hostname,
+                                                     port=endpoint.port,
+                                                     is_secure=endpoint.scheme == 'https',
+                                                     calling_format=boto.s3.connection.OrdinaryCallingFormat(),
+                                                     **credentials)
+    elif region:
+        module = __import__(module_name, fromlist=['connect_to_region'])
+        connection = module.connect_to_region(region, **credentials)
+    else:
+        connection = getattr(boto, connect_function)(**credentials)
+    logger.debug('Connected to %s.' % description)
+
+    return connection
+
+def get_connection_statistics():
+    with _statistics_lock:
+        return dict(statistics)
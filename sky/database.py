@@ -1,8 +1,15 @@
 import sys
-import time
 import logging
+import threading
+import contextvars
+from collections.abc import Mapping
+from concurrent.futures import Future
 import boto
+import boto.rds2.exceptions
 from .compute import create_security_group
+from .waiter import wait_until
+from .cache import uncached
+from .connections import get_connection
 from .state import config, mode
 
 logger = logging.getLogger(__name__)
@@ -31,13 +38,85 @@ INBOUND_PORT = {
     'oracle':     1520,
 }
 
-def connect_rds():
-    logger.debug('Connecting to the Amazon Relational Database Service (Amazon RDS).')
-    rds = boto.connect_rds2(aws_access_key_id=config['AWS_ACCESS_KEY_ID'],
-                            aws_secret_access_key=config['AWS_SECRET_ACCESS_KEY'])
-    logger.debug('Connected to Amazon RDS.')
-    
-    return rds
+# Endpoints that are still being resolved, so that a deployment can wait for them before it finishes.
+_endpoints = []
+_endpoints_lock = threading.Lock()
+
+class Endpoint(Mapping):
+    """
+    A database endpoint (``{'Address': ..., 'Port': ...}``) that is resolved in
+    the background. Reading the endpoint blocks until the database is
+    available, so that only its consumers wait on Amazon RDS provisioning.
+
+    Endpoints that nothing reads are still waited on by
+    :func:`wait_for_endpoints`, so that failures are never lost.
+    """
+
+    def __init__(self, name, function):
+        self.name = name
+        self.future = Future()
+        with _endpoints_lock:
+            _endpoints.append(self)
+
+        # Resolve the endpoint on a daemon thread, within the current context.
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(self._resolve, function), name='endpoint-%s' % name)
+        thread.daemon = True
+        thread.start()
+
+    def _resolve(self, function):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            self.future.set_result(function())
+        except BaseException as error:
+            logger.error('Could not resolve database (%s) endpoint: %s' % (self.name, error))
+            self.future.set_exception(error)
+
+    def result(self, timeout=None):
+        if not self.future.done():
+            logger.info('Waiting for database (%s) endpoint.' % self.name)
+        return self.future.result(timeout)
+
+    def done(self):
+        return self.future.done()
+
+    def __getitem__(self, key):
+        return self.result()[key]
+
+    def __iter__(self):
+        return iter(self.result())
+
+    def __len__(self):
+        return len(self.result())
+
+    def __str__(self):
+        # Block until the endpoint is resolved, rather than rendering a placeholder (e.g., into a configuration file).
+        return str(self.result())
+
+    def __repr__(self):
+        return repr(self.result()) if self.done() else '<Endpoint (%s) pending>' % self.name
+
+def wait_for_endpoints(timeout=None):
+    """
+    Wait for every outstanding :class:`Endpoint`, re-raising the first
+    failure (e.g., a :class:`sky.waiter.WaitTimeout`).
+    """
+    with _endpoints_lock:
+        endpoints = list(_endpoints)
+        del _endpoints[:]
+
+    failure = None
+    for endpoint in endpoints:
+        try:
+            endpoint.result(timeout)
+        except BaseException as error:
+            failure = failure or error
+    if failure:
+        raise failure
+
+def connect_rds(region=None):
+    return get_connection('rds', region)
 
 def create_db_parameter_group(name=None, engine='postgresql'):
     # Connect to the Amazon Relational Database Service (Amazon RDS).
@@ -270,23 +349,33 @@ def create_database(vpc, subnets, name=None, engine='postgresql', storage=5, app
                                          ('Environment', config['ENVIRONMENT']  )])
     logger.debug('Tagged Amazon RDS Resource (%s).' % database_arn)
 
-    # Get Database Endpoint.
+    # Get Database Endpoint in the background, so that only consumers of the endpoint wait for the database.
     logger.info('Getting endpoint for database (%s).' % name)
-    endpoint = None
-    while not endpoint:
-        response = rds_connection.describe_db_instances(db_instance_identifier=name,
-                                                        filters=None,
-                                                        max_records=None,
-                                                        marker=None)
-        endpoint = response['DescribeDBInstancesResponse']\
-                           ['DescribeDBInstancesResult']\
-                           ['DBInstances'][-1]\
-                           ['Endpoint']
-        if not endpoint:
-            logger.debug('Waiting for database endpoint...')
-            time.sleep(1)
-        else:
-            logger.info('Got database endpoint (%s).' % endpoint)
-    db_instance['endpoint'] = endpoint
+    db_instance['endpoint'] = Endpoint(name, lambda: get_endpoint(name))
 
     return db_instance
+
+def get_endpoint(name):
+    # Connect to the Amazon Relational Database Service (Amazon RDS).
+    rds_connection = connect_rds()
+
+    # Wait for the Database Endpoint to be assigned.
+    response = wait_until(lambda: uncached(rds_connection).describe_db_instances(db_instance_identifier=name,
+                                                                       filters=None,
+                                                                       max_records=None,
+                                                                       marker=None),
+                          condition=lambda response: response['DescribeDBInstancesResponse']\
+                                                             ['DescribeDBInstancesResult']\
+                                                             ['DBInstances'][-1]\
+                                                             .get('Endpoint'),
+                          description='database (%s) endpoint' % name,
+                          delay=1,
+                          max_delay=30,
+                          timeout=3600)
+    endpoint = response['DescribeDBInstancesResponse']\
+                       ['DescribeDBInstancesResult']\
+                       ['DBInstances'][-1]\
+                       ['Endpoint']
+    logger.info('Got database endpoint (%s).' % endpoint)
+
+    return endpoint
@@ -0,0 +1,210 @@
+import os
+import json
+import logging
+from .state import config, mode
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+# Map boto resource classes to a resource type and the filter used to look them up by ID.
+RESOURCE_TYPES = {
+    'VPC':             ('vpc',              'vpc-id'),
+    'Subnet':          ('subnet',           'subnet-id'),
+    'SecurityGroup':   ('security_group',   'group-id'),
+    'RouteTable':      ('route_table',      'route-table-id'),
+    'InternetGateway': ('internet_gateway', 'internet-gateway-id'),
+    'Instance':        ('instance',         'instance-id'),
+}
+
+# Resource attributes worth recording alongside resource IDs.
+RESOURCE_ATTRIBUTES = ['name', 'vpc_id', 'subnet_id', 'availability_zone', 'cidr_block', 'state']
+
+# Resources that were recorded by a previous run and verified to still exist, keyed by resource type and ID.
+known_resources = {}
+
+def get_state_path():
+    # Keep one state file per deployment environment alongside the skyfile.
+    return os.path.join(os.getcwd(), '.sky', 'state-%s.json' % (config['ENVIRONMENT'] or 'default'))
+
+def load_state(path=None):
+    path = path or get_state_path()
+    try:
+        with open(path, 'r') as state_file:
+            state = json.load(state_file)
+        logger.info('Loaded deployment state (%s).' % path)
+    except FileNotFoundError:
+        logger.info('No deployment state found (%s).' % path)
+        state = {}
+    except ValueError as error:
+        logger.error('Ignoring unreadable deployment state (%s): %s' % (path, error))
+        state = {}
+
+    if state.get('version') != STATE_VERSION:
+        state = {'version': STATE_VERSION, 'nodes': {}}
+
+    return state
+
+def save_state(state, nodes, path=None):
+    path = path or get_state_path()
+
+    # Record the resources produced by each node, keeping records for nodes that were not built.
+    for node in nodes:
+        resources, unencoded = {}, []
+        for name, value in (node.resources or {}).items():
+            encoded = encode_resource(value)
+            if encoded is not None:
+                resources[name] = encoded
+            else:
+                unencoded.append(name)
+
+        # A node can't be restored without all of its resources, so it is re-run instead.
+        if unencoded:
+            logger.debug('(%s) can\'t be restored, since its resources (%s) can\'t be recorded.' % (node.__name__, ', '.join(sorted(unencoded))))
+        state['nodes'][node.__name__] = {'fingerprint': node.fingerprint, 'resources': resources, 'restorable': not unencoded}
+
+    # Replace the state file atomically.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as state_file:
+        json.dump(state, state_file, indent=2, sort_keys=True)
+    os.replace(temporary_path, path)
+    logger.info('Saved deployment state (%s).' % path)
+
+    return state
+
+def encode_resource(value):
+    # Record AWS resources by type, ID and notable attributes.
+    if type(value).__name__ in RESOURCE_TYPES and getattr(value, 'id', None):
+        resource_type = RESOURCE_TYPES[type(value).__name__][0]
+        attributes = {attribute: getattr(value, attribute) for attribute in RESOURCE_ATTRIBUTES \
+                      if isinstance(getattr(value, attribute, None), (str, int, float, bool))}
+        attributes['tags'] = dict(getattr(value, 'tags', None) or {})
+        return {'resource': resource_type, 'id': value.id, 'attributes': attributes}
+
+    # Record lists of AWS resources and plain values that can be serialized.
+    if isinstance(value, (list, tuple)):
+        encoded = [encode_resource(item) for item in value]
+        return {'list': encoded} if all(item is not None for item in encoded) else None
+
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return {'value': value}
+
+    return None
+
+def decode_resource(encoded):
+    # Resolve recorded AWS resources to the resources verified during this run.
+    if 'resource' in encoded:
+        resource = known_resources.get((encoded['resource'], encoded['id']))
+        if resource is None:
+            raise KeyError('%s (%s) no longer exists.' % (encoded['resource'], encoded['id']))
+        return resource
+
+    if 'list' in encoded:
+        return [decode_resource(item) for item in encoded['list']]
+
+    return encoded['value']
+
+def restore_nodes(state, dependency_graph, forced=()):
+    # Reject forced names that match no infrastructure, as undefined targets are rejected.
+    unknown = set(forced) - set(node.__name__ for dependencies in dependency_graph for node in dependencies)
+    if unknown:
+        raise RuntimeError('Forced infrastructure (%s) is not defined.' % ', '.join(sorted(unknown)))
+
+    # Assign fingerprints from the most-independent nodes to the most-dependent nodes.
+    fingerprints = {}
+    for dependencies in dependency_graph:
+        for node in dependencies:
+            node.fingerprint = node.get_fingerprint([fingerprints[name] for name in node.dependencies or ()])
+            fingerprints[node.__name__] = node.fingerprint
+
+    # Restore unchanged nodes, re-running any node whose dependencies are being re-run.
+    restored, rerun = [], set()
+    for dependencies in dependency_graph:
+        for node in dependencies:
+            recorded = state.get('nodes', {}).get(node.__name__)
+            if node.__name__ in forced:
+                logger.info('Forcing (%s) to run.' % node.__name__)
+            elif getattr(node, 'category', None) == mode.EPHEMERAL:
+                # Ephemeral infrastructure (e.g., the application tier) is rebuilt to pick up application changes.
+                logger.debug('(%s) is ephemeral, so it is rebuilt on every run.' % node.__name__)
+            elif rerun & set(node.dependencies or ()):
+                logger.debug('(%s) requires infrastructure that will be re-run.' % node.__name__)
+            elif not recorded or recorded.get('fingerprint') != node.fingerprint:
+                logger.debug('(%s) has changed since the previous run.' % node.__name__)
+            elif not recorded.get('restorable', True):
+                logger.debug('(%s) has resources that weren\'t recorded by the previous run.' % node.__name__)
+            else:
+                try:
+                    node.restore({name: decode_resource(encoded) for name, encoded in recorded['resources'].items()})
+                    restored.append(node)
+                    continue
+                except KeyError as error:
+                    logger.info('Could not restore (%s): %s' % (node.__name__, error.args[0]))
+            rerun.add(node.__name__)
+
+    return restored
+
+def get_recorded_ids(state):
+    # Collect recorded resource IDs, grouped by resource type.
+    recorded_ids = {}
+
+    def collect(encoded):
+        if 'resource' in encoded:
+            recorded_ids.setdefault(encoded['resource'], set()).add(encoded['id'])
+        for item in encoded.get('list', ()):
+            collect(item)
+
+    for node in state.get('nodes', {}).values():
+        for encoded in node['resources'].values():
+            collect(encoded)
+
+    return recorded_ids
+
+def verify_state(state):
+    # Defer import to resolve interdependency between .deployment and the service modules.
+    from .compute import connect_ec2
+    from .networking import connect_vpc
+
+    known_resources.clear()
+    recorded_ids = get_recorded_ids(state)
+    if not recorded_ids:
+        return known_resources
+
+    vpc_connection = connect_vpc()
+    ec2_connection = connect_ec2()
+
+    # Look up recorded resources with one batched ID filter per resource type.
+    lookups = {
+        'vpc':              vpc_connection.get_all_vpcs,
+        'subnet':           vpc_connection.get_all_subnets,
+        'route_table':      vpc_connection.get_all_route_tables,
+        'internet_gateway': vpc_connection.get_all_internet_gateways,
+        'security_group':   ec2_connection.get_all_security_groups,
+        'instance':         lambda filters: [instance for reservation in ec2_connection.get_all_instances(filters=filters) \
+                                             for instance in reservation.instances],
+    }
+    id_filters = {resource_type: id_filter for resource_type, id_filter in RESOURCE_TYPES.values()}
+
+    for resource_type, resource_ids in recorded_ids.items():
+        resources = lookups[resource_type](filters={id_filters[resource_type]: sorted(resource_ids)})
+        for resource in resources:
+            known_resources[(resource_type, resource.id)] = resource
+        logger.info('Verified %d of %d recorded %s resources.' % (len(resources), len(resource_ids), resource_type.replace('_', ' ')))
+
+    return known_resources
+
+def find_resources(resource_type, tags=None, **attributes):
+    # Search verified resources from the previous run, rather than scanning AWS by tag.
+    resources = []
+    for (known_type, resource_id), resource in sorted(known_resources.items(), key=lambda item: item[0]):
+        if known_type != resource_type:
+            continue
+        if any(getattr(resource, attribute, None) != value for attribute, value in attributes.items()):
+            continue
+        resource_tags = getattr(resource, 'tags', None) or {}
+        if tags and any(resource_tags.get(key) != value for key, value in tags.items()):
+            continue
+        resources.append(resource)
+
+    return resources
@@ -1,9 +1,26 @@
 import sys
+import types
+import hashlib
 import logging
 from .state import config, mode
 
 logger = logging.getLogger(__name__)
 
+def stable_repr(value):
+    # Represent plain values the same way on every run: sets are sorted, and other objects, whose default
+    # representation includes their address, are represented by their type.
+    if value is None or isinstance(value, (str, bytes, int, float, bool)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return '%s(%s)' % (type(value).__name__, ', '.join(stable_repr(item) for item in value))
+    if isinstance(value, (set, frozenset)):
+        return '%s(%s)' % (type(value).__name__, ', '.join(sorted(stable_repr(item) for item in value)))
+    if isinstance(value, dict):
+        return 'dict(%s)' % ', '.join('%s: %s' % (stable_repr(key), stable_repr(item)) for (key, item) in value.items())
+    if isinstance(value, Infrastructure):
+        return repr(value)
+    return '<%s>' % type(value).__qualname__
+
 class Infrastructure(object):
 
     _wrapped = None
@@ -12,6 +29,7 @@ class Infrastructure(object):
     _original_creation_mode = None
     _locals = None
     _result = None
+    fingerprint = None
 
     def __init__(self, callable_, *args, **kwargs):
         self.__name__ = callable_.__name__ if hasattr(callable_, '__name__') else 'undefined'
@@ -30,25 +48,91 @@ class Infrastructure(object):
         # Set the creation mode, if the object specifies one.
         self._set_creation_mode()
 
-        # Define a source code profiler.
-        def profiler(frame, event, arg):
-            if event == 'return':
-                self._locals = frame.f_locals.copy()
+        # Capture the wrapped function's frame from its own call event, then stop tracing immediately, so that
+        # nested calls (e.g., boto's HTTP and XML handling) run untraced. Tracing is scoped to the current thread.
+        frames = []
+        code = getattr(self._wrapped, '__code__', None)
+        previous_tracer = sys.gettrace()
+
+        def tracer(frame, event, arg):
+            if event == 'call' and (code is None or frame.f_code is code):
+                frames.append(frame)
+                sys.settrace(previous_tracer)
+            return previous_tracer(frame, event, arg) if previous_tracer else None
 
-        # Activate the profiler on the next call, return or exception.
-        sys.setprofile(profiler)
+        sys.settrace(tracer)
         try:
-            # Trace the function call.
             self._result = self._wrapped(*args, **kwargs)
         finally:
-            # Disable the source code profiler.
-            sys.setprofile(None)
+            sys.settrace(previous_tracer)
+
+        # Keep the local variables of the completed frame, which remain available after it has returned.
+        if frames:
+            self._locals = frames[0].f_locals.copy()
 
         # Reset the creation mode, if the object specifies one.
         self._reset_creation_mode()
 
         return self._result
 
+    def get_fingerprint(self, dependency_fingerprints=()):
+        # Fingerprint the wrapped function's code, the values that it reads from module globals and closures (e.g., a
+        # CIDR block or an AMI ID defined at the top of a Skyfile), the object's arguments and the fingerprints of its
+        # dependencies.
+        digest = hashlib.sha256()
+        namespace = getattr(self._wrapped, '__globals__', None) or {}
+        seen = set()
+
+        def update(code):
+            if code in seen:
+                return
+            seen.add(code)
+            digest.update(code.co_code)
+            digest.update(repr(code.co_names).encode('utf-8'))
+            for constant in code.co_consts:
+                if isinstance(constant, types.CodeType):
+                    update(constant)
+                else:
+                    digest.update(repr(constant).encode('utf-8'))
+            for name in code.co_names:
+                if name in namespace:
+                    update_value(namespace[name])
+
+        def update_value(value):
+            if isinstance(value, types.FunctionType):
+                # Follow helper functions defined alongside the wrapped function, but not library functions.
+                if value.__globals__ is namespace:
+                    update(value.__code__)
+            elif not isinstance(value, types.ModuleType):
+                digest.update(stable_repr(value).encode('utf-8'))
+
+        for cell in getattr(self._wrapped, '__closure__', None) or ():
+            try:
+                update_value(cell.cell_contents)
+            except ValueError: # The closure variable hasn't been assigned yet.
+                pass
+
+        code = getattr(self._wrapped, '__code__', None)
+        if code:
+            update(code)
+        else:
+            digest.update(repr(self._wrapped).encode('utf-8'))
+
+        digest.update(repr(getattr(self._wrapped, '__defaults__', None)).encode('utf-8'))
+        digest.update(repr((self.environment,
+                            sorted(self.dependencies or ()),
+                            mode(self.category).name if self.category else None)).encode('utf-8'))
+        for dependency_fingerprint in sorted(dependency_fingerprints):
+            digest.update(dependency_fingerprint.encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def restore(self, resources, result=None):
+        # Reuse the resources produced by a previous run instead of calling the wrapped function.
+        self._locals = resources
+        self._result = result
+        logger.info('Restored (%s) from the previous run.' % self)
+
     def __getattr__(self, attr):
         return self._locals[attr] if self._locals else super(Infrastructure, self).__getattr__()
 
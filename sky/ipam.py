@@ -0,0 +1,112 @@
+import bisect
+import logging
+import ipaddress
+
+logger = logging.getLogger(__name__)
+
+class AddressPool(object):
+    """
+    A buddy allocator over an IPv4 CIDR block (e.g., a VPC's address space),
+    which hands out the smallest free, aligned block that fits each request.
+
+    Free blocks are kept in a sorted list per prefix length, so allocating,
+    reserving and releasing a block take O(log n) searches plus at most one
+    split or merge per prefix length.
+    """
+
+    def __init__(self, cidr_block, allocated=()):
+        self.network = ipaddress.IPv4Network(cidr_block, strict=False)
+        self.free = {prefixlen: [] for prefixlen in range(self.network.prefixlen, 33)}
+        self.free[self.network.prefixlen].append(int(self.network.network_address))
+
+        # Carve out blocks that are already in use.
+        for block in allocated:
+            self.reserve(block)
+
+    def _take(self, prefixlen, address):
+        # Remove a free block, if present.
+        blocks = self.free[prefixlen]
+        index = bisect.bisect_left(blocks, address)
+        if index < len(blocks) and blocks[index] == address:
+            del blocks[index]
+            return True
+        return False
+
+    def _split(self, prefixlen, address, target_prefixlen, target_address):
+        # Split a free block down to a target block, freeing the halves that don't contain it.
+        while prefixlen < target_prefixlen:
+            prefixlen += 1
+            half = 1 << (32 - prefixlen)
+            if target_address & half:
+                bisect.insort(self.free[prefixlen], address)
+                address += half
+            else:
+                bisect.insort(self.free[prefixlen], address + half)
+
+    def allocate(self, prefixlen):
+        """
+        Allocate the lowest free block of the smallest size that fits a block
+        with the given prefix length (e.g., ``24``), and return it as a CIDR
+        block string. Raises :class:`RuntimeError` if no block fits.
+        """
+        prefixlen = int(prefixlen)
+        if not self.network.prefixlen <= prefixlen <= 32:
+            raise RuntimeError('A /%d block does not fit within (%s).' % (prefixlen, self.network))
+
+        for candidate in range(prefixlen, self.network.prefixlen - 1, -1):
+            if self.free[candidate]:
+                address = self.free[candidate].pop(0)
+                self._split(candidate, address, prefixlen, address)
+                return '%s/%d' % (ipaddress.IPv4Address(address), prefixlen)
+
+        raise RuntimeError('No free /%d block is left within (%s).' % (prefixlen, self.network))
+
+    def reserve(self, cidr_block):
+        """
+        Mark a block (e.g., an existing subnet) as in use. Blocks outside the
+        pool are ignored; overlapping blocks raise :class:`RuntimeError`.
+        """
+        block = ipaddress.IPv4Network(cidr_block, strict=False)
+        if not block.subnet_of(self.network):
+            return
+        address, prefixlen = int(block.network_address), block.prefixlen
+
+        # Find the free block that contains the reserved block, and split it down.
+        for candidate in range(prefixlen, self.network.prefixlen - 1, -1):
+            candidate_address = address & (0xffffffff << (32 - candidate)) & 0xffffffff
+            if self._take(candidate, candidate_address):
+                self._split(candidate, candidate_address, prefixlen, address)
+                return
+
+        raise RuntimeError('The block (%s) overlaps a block already in use within (%s).' % (block, self.network))
+
+    def release(self, cidr_block):
+        # Return a block to the pool, merging it with its free buddies.
+        block = ipaddress.IPv4Network(cidr_block, strict=False)
+        address, prefixlen = int(block.network_address), block.prefixlen
+        while prefixlen > self.network.prefixlen:
+            buddy = address ^ (1 << (32 - prefixlen))
+            if not self._take(prefixlen, buddy):
+                break
+            address &= buddy
+            prefixlen -= 1
+        bisect.insort(self.free[prefixlen], address)
+
+    def capacity(self, prefixlen):
+        # The number of blocks with the given prefix length that fit within the free blocks.
+        return sum(len(blocks) << (prefixlen - block_prefixlen) for block_prefixlen, blocks in self.free.items() if block_prefixlen <= prefixlen)
+
+    def fit(self, count, prefixlen=None, max_prefixlen=32):
+        """
+        Get the shortest prefix length, no shorter than ``prefixlen``, for
+        which ``count`` blocks fit within the free blocks. Raises
+        :class:`RuntimeError` if even blocks with ``max_prefixlen`` don't fit.
+        """
+        for candidate in range(max(int(prefixlen or 0), self.network.prefixlen), max_prefixlen + 1):
+            if self.capacity(candidate) >= count:
+                return candidate
+        raise RuntimeError('No %d free /%d blocks are left within (%s).' % (count, max_prefixlen, self.network))
+
+    def available(self):
+        # The number of free addresses in the pool.
+        return sum(len(blocks) << (32 - prefixlen) for prefixlen, blocks in self.free.items())
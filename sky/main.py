@@ -7,9 +7,15 @@ import sys
 import types
 import logging
 import importlib
-from copy import deepcopy
 from .utils import parse_arguments
 from .infrastructure import Infrastructure
+from .scheduler import execute
+from .deployment import load_state, verify_state, save_state, restore_nodes
+from .connections import get_connection_statistics
+from .waiter import get_wait_statistics
+from .cache import get_cache_statistics
+from .catalog import refresh_catalog
+from .database import wait_for_endpoints
 from .state import ready, config
 
 __author__ = 'Jared Contrascere'
@@ -50,119 +56,166 @@ def load_infrastructure(module):
 
     return infrastructure_objects
 
-def build_dependency_graph(nodes, level=1):
-    # Create an empty graph.
+def index_dependencies(nodes):
+    # Index nodes by name, skipping nodes collected more than once (e.g., through two imports of the same module).
+    nodes_by_name = {}
+    for node in nodes:
+        if node.__name__ in nodes_by_name and nodes_by_name[node.__name__] is not node:
+            raise RuntimeError('Infrastructure (%s) is defined more than once.' % node.__name__)
+        nodes_by_name[node.__name__] = node
+
+    # Build an adjacency index from each node to the nodes that require it.
+    dependents = {name: [] for name in nodes_by_name}
+    for name, node in nodes_by_name.items():
+        for dependency in node.dependencies or ():
+            if dependency not in nodes_by_name:
+                raise RuntimeError('(%s) requires undefined infrastructure (%s).' % (name, dependency))
+            dependents[dependency].append(name)
+
+    return nodes_by_name, dependents
+
+def find_dependency_cycle(nodes_by_name, candidates):
+    # Follow unresolved dependencies from any candidate until a node repeats.
+    name = next(iter(candidates))
+    path, positions = [], {}
+    while name not in positions:
+        positions[name] = len(path)
+        path.append(name)
+        name = next(dependency for dependency in sorted(nodes_by_name[name].dependencies) if dependency in candidates)
+
+    return path[positions[name]:] + [name]
+
+def build_dependency_graph(nodes):
+    # Index nodes and their dependents, without copying the nodes.
+    nodes_by_name, dependents = index_dependencies(nodes)
+
+    # Count unresolved dependencies for each node.
+    in_degree = {name: len(node.dependencies or ()) for name, node in nodes_by_name.items()}
+
+    # Peel off independent nodes, one layer at a time (Kahn's algorithm).
     graph = []
+    layer = [name for name in nodes_by_name if not in_degree[name]]
+    resolved = 0
+    while layer:
+        graph.append([nodes_by_name[name] for name in layer])
+        resolved += len(layer)
+        logger.debug('(%s) ready at level %d.' % (', '.join(layer), len(graph)))
+
+        next_layer = []
+        for name in layer:
+            for dependent in dependents[name]:
+                in_degree[dependent] -= 1
+                if not in_degree[dependent]:
+                    next_layer.append(dependent)
+        layer = next_layer
 
-    # Create a copy of the nodes list to work with.
-    _nodes = deepcopy(nodes)
-
-    # Store the length of the nodes list, so that circular dependencies can be detected.
-    original_count = len(_nodes)
+    # Check for circular dependencies.
+    if resolved != len(nodes_by_name):
+        cycle = find_dependency_cycle(nodes_by_name, {name for name, count in in_degree.items() if count})
+        raise RuntimeError('Circular dependencies detected (%s).' % ' -> '.join(cycle))
 
-    # Determine independent nodes.
-    independent_nodes = [node for node in _nodes if not node.dependencies]
+    return graph
 
-    if independent_nodes:
-        # Remove independent nodes from the search space.
-        for independent_node in independent_nodes:
-            _nodes.remove(independent_node)
-            logger.debug('(%s) is ready.' % independent_node.__name__)
+def get_required_nodes(dependency_graph, targets):
+    # Index the nodes in the dependency graph by name.
+    nodes_by_name = {node.__name__: node for dependencies in dependency_graph for node in dependencies}
 
-        # Prune independent node from all node dependencies.
-        for name, dependencies in [(node.__name__, node.dependencies) for node in _nodes if node.dependencies]:
-            logger.debug('(%s) required: (%s).' % (name, ', '.join(list(dependencies))))
-            resolved_dependencies = {independent_node.__name__ for independent_node in independent_nodes}
-            dependencies.difference_update(resolved_dependencies)
-            logger.debug('(%s) now requires: (%s).' % (name, ', '.join(list(dependencies))))
+    if 'all' in targets:
+        return set(nodes_by_name)
 
-        # Repeat search for newly-independent nodes, if any are left.
-        if _nodes:
-            graph = build_dependency_graph(_nodes, level=level+1)
+    # Collect every node reachable from the targets through their requisite infrastructure.
+    required = set()
+    unvisited = list(targets)
+    while unvisited:
+        name = unvisited.pop()
+        if name in required:
+            continue
+        if name not in nodes_by_name:
+            raise RuntimeError('Target (%s) is not defined.' % name)
+        required.add(name)
+        unvisited.extend(nodes_by_name[name].dependencies or ())
 
-        # Build graph from the independent nodes to the most-dependent nodes.
-        graph.insert(0, independent_nodes)
+    logger.debug('Targets (%s) require (%s).' % (', '.join(targets), ', '.join(sorted(required))))
+    return required
 
-    # Check for circular dependencies.
-    count = 0
-    for depth in graph:
-        for breadth in depth:
-            count += 1
-    if original_count != count:
-        raise RuntimeError('Circular dependencies detected.')
-
-    # Restore node dependencies following graph creation, since the recursive algorithm is destructive.
-    if _nodes and level == 1:
-        for dependencies in graph:
-            for dependency in dependencies:
-                dependency.dependencies = next(node.dependencies for node in nodes if node.__name__ == dependency.__name__)
+def build_target(dependency_graph, target='all', jobs=None):
+    targets = [target] if isinstance(target, str) else list(target)
 
-    return graph
+    # Restrict the dependency graph to the union of the targets' dependency chains.
+    required = get_required_nodes(dependency_graph, targets)
 
-def build_target(dependency_graph, target='all'):
-    # Rebuild the dependency graph, if a specific target was specified.
-    if target != 'all':
-        target_found = False
-        target_dependencies = set()
-        temporary_graph = []
-
-        # Search the complete dependency graph for the target node.
-        for dependencies in dependency_graph:
-            # Add the current dependency group to the temporary graph.
-            temporary_graph.append(dependencies)
-
-            # Search each dependency in the dependency group.
-            for dependency in dependencies:
-                # Locate the target node.
-                if dependency.__name__ == target:
-                    # Truncate the most-recently added dependency group to the target node.
-                    temporary_graph[-1] = [dependency]
-
-                    # Store the target's dependencies so that they are not pruned.
-                    target_dependencies = dependency.dependencies
-
-                    # Stop traversing the dependency graph (inner loop) when the target node has been located.
-                    target_found = True
-                    break
-
-            # Stop traversing the dependency graph (outer loop) when the target node has been located.
-            if target_found:
-                # Traverse through the temporary graph backwards.
-                for dependencies in reversed(temporary_graph):
-                    for dependency in dependencies:
-
-                        # Prune nodes that are not part of the target's dependency chain.
-                        if dependency.__name__ not in target_dependencies and dependency.__name__ != target:
-                            logger.debug('Pruning unneeded node (%s).' % dependency.__name__)
-                            dependencies.remove(dependency)
-                            logger.debug('Pruned unneeded node (%s).' % dependency.__name__)
-
-                        # Add indirect dependencies to the target's dependency chain.
-                        elif dependency.__name__ in target_dependencies and dependency.dependencies:
-                            logger.debug('Unioning additional dependency/ies (%s).' % dependency.dependencies)
-                            target_dependencies |= dependency.dependencies
-                            logger.debug('Unioned additional dependency/ies (%s).' % dependency.dependencies)
-
-                # Reset the dependency graph.
-                dependency_graph = temporary_graph
-                break
-
-    # Build the target node.
+    # Skip nodes that have already been built during this run.
+    nodes = []
     for dependencies in dependency_graph:
         for dependency in dependencies:
-            dependency()
-            ready[dependency.__name__] = dependency
+            if dependency.__name__ not in required:
+                continue
+            if dependency.__name__ in ready:
+                logger.debug('(%s) has already been built.' % dependency.__name__)
+                continue
+            nodes.append(dependency)
+
+    # Build the target nodes, running independent nodes concurrently.
+    timings = execute(nodes, jobs=jobs)
+
+    for name, (start, finish) in sorted(timings.items(), key=lambda timing: timing[1]):
+        logger.info('(%s) started at %.3fs and finished at %.3fs.' % (name, start, finish))
+
+    return timings
+
+def log_statistics():
+    connection_statistics = get_connection_statistics()
+    logger.info('Created %d AWS connection(s), reused %d, and handed %d over from finished threads.' % (connection_statistics.get('created', 0),
+                                                                                                       connection_statistics.get('reused', 0),
+                                                                                                       connection_statistics.get('adopted', 0)))
+    logger.info('Made %d wait(s) with %d attempt(s) in %.2fs.' % get_wait_statistics())
+    cache_statistics = get_cache_statistics()
+    logger.info('Served %d describe call(s) from cache, made %d, and invalidated %d cached result(s).' % \
+                (cache_statistics.get('hits', 0), cache_statistics.get('misses', 0), cache_statistics.get('invalidations', 0)))
 
 def main():
     parse_arguments()
+
+    # Refresh cached AMI and Availability Zone lookups, without loading the skyfile.
+    if config['COMMAND'] == 'catalog':
+        refresh_catalog()
+        log_statistics()
+        return
+
     module = load_skyfile()
     infrastructure = load_infrastructure(module)
     dependency_graph = build_dependency_graph(infrastructure)
 
-    targets = config['TARGETS']
+    # Verify the resources recorded by the previous run, so that they can be reused without tag-filtered scans.
+    state = load_state()
+
+    # Plan against an in-memory provider that starts out with the recorded resources, if this is a dry run.
+    if config['DRY_RUN']:
+        from .mock import provider
+        provider.seed(state)
+
+    verify_state(state)
+
+    # Skip nodes that are unchanged since the last successful run, restoring their resources instead.
+    for node in restore_nodes(state, dependency_graph, forced=config['FORCE']):
+        ready[node.__name__] = node
+
+    if config['DRY_RUN']:
+        build_target(dependency_graph, target=config['TARGETS'], jobs=config['JOBS'])
+        wait_for_endpoints()
+        provider.report()
+        log_statistics()
+        return
+
+    try:
+        build_target(dependency_graph, target=config['TARGETS'], jobs=config['JOBS'])
 
-    for target in targets:
-        build_target(dependency_graph, target=target)
+        # Wait for resources that are still being resolved in the background, so that their failures fail the run.
+        wait_for_endpoints()
+    finally:
+        # Record the resources produced by every node built so far.
+        save_state(state, [node for node in ready.values() if isinstance(node, Infrastructure)])
+        log_statistics()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,605 @@
+import re
+import threading
+import logging
+from fnmatch import fnmatch
+from collections import Counter, OrderedDict
+import boto
+import boto.exception
+import boto.rds2.exceptions
+from .deployment import RESOURCE_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Prefixes used to generate identifiers for mock resources.
+ID_PREFIX = {
+    'vpc':               'vpc',
+    'subnet':            'subnet',
+    'security_group':    'sg',
+    'route_table':       'rtb',
+    'internet_gateway':  'igw',
+    'network_acl':       'acl',
+    'dhcp_options':      'dopt',
+    'instance':          'i',
+    'network_interface': 'eni',
+    'reservation':       'r',
+    'association':       'rtbassoc',
+}
+
+# Map EC2 filter names to mock resource attributes.
+FILTER_ATTRIBUTES = {
+    'vpc-id':                       'vpc_id',
+    'subnet-id':                    'subnet_id',
+    'availability-zone':            'availability_zone',
+    'group-name':                   'name',
+    'cidr':                         'cidr_block',
+    'cidrBlock':                    'cidr_block',
+    'instance-state-name':          'state',
+    'attachment.vpc-id':            'vpc_id',
+    'attachment.instance-id':       'instance_id',
+    'association.main':             'main',
+    'route.destination-cidr-block': 'destinations',
+    'resource-id':                  'resource_id',
+    'resource-type':                'resource_type',
+    'name':                         'name',
+}
+
+# Map resource types to the filter that matches their own identifier.
+ID_FILTERS = {resource_type: id_filter for resource_type, id_filter in RESOURCE_TYPES.values()}
+
+DEFAULT_ZONES = ['us-east-1a', 'us-east-1b', 'us-east-1c', 'us-east-1d']
+
+class MockResource(object):
+    """
+    An in-memory stand-in for a boto resource object.
+    """
+
+    def __init__(self, **attributes):
+        self.tags = {}
+        self.__dict__.update(attributes)
+
+    def __repr__(self):
+        return 'MockResource:' + str(getattr(self, 'id', None) or getattr(self, 'name', None))
+
+    def update(self, *args, **kwargs):
+        return getattr(self, 'state', None)
+
+class MockResultSet(list):
+    """
+    An in-memory stand-in for a page of a boto listing (i.e., a
+    :class:`boto.resultset.ResultSet`).
+    """
+    is_truncated = False
+
+# Name mock resource classes after the boto classes they stand in for, so that they are recorded like boto resources.
+MOCK_CLASSES = {resource_type: type(class_name, (MockResource,), {}) for class_name, (resource_type, id_filter) in RESOURCE_TYPES.items()}
+
+class MockProvider(object):
+    """
+    An in-memory cloud that records the actions a deployment would take and
+    the number of API calls it would make.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.resources = OrderedDict()
+        self.preexisting = set()
+        self.reused = set()
+        self.actions = []
+        self.calls = Counter()
+        self.count = 0
+
+    def generate_id(self, resource_type):
+        # Avoid identifiers of resources that were seeded from a previous run.
+        identifier = None
+        while not identifier or (resource_type, identifier) in self.resources:
+            self.count += 1
+            identifier = '%s-%08x' % (ID_PREFIX.get(resource_type, resource_type), self.count)
+        return identifier
+
+    def record(self, action, resource_type, identifier):
+        self.actions.append((action, resource_type, identifier))
+        logger.debug('Planned to %s %s (%s).' % (action, resource_type.replace('_', ' '), identifier))
+
+    def add(self, resource_type, resource, action='create'):
+        self.resources[(resource_type, resource.id)] = resource
+        if action:
+            self.record(action, resource_type, resource.id)
+        return resource
+
+    def create(self, resource_type, **attributes):
+        attributes.setdefault('id', self.generate_id(resource_type))
+        return self.add(resource_type, MOCK_CLASSES.get(resource_type, MockResource)(**attributes))
+
+    def delete(self, resource_type, resource_id):
+        if self.resources.pop((resource_type, resource_id), None) is not None:
+            self.record('delete', resource_type, resource_id)
+            return True
+        return False
+
+    def get(self, resource_type, resource_id):
+        return self.resources.get((resource_type, resource_id))
+
+    def find(self, resource_type, ids=None, filters=None):
+        if isinstance(ids, str):
+            ids = [ids]
+
+        resources = []
+        for (known_type, resource_id), resource in self.resources.items():
+            if known_type != resource_type:
+                continue
+            if ids and resource_id not in ids:
+                continue
+            if filters and not all(self.match(resource_type, resource, name, value) for name, value in filters.items()):
+                continue
+            resources.append(resource)
+
+        # Record pre-existing resources that the deployment would reuse.
+        for resource in resources:
+            key = (resource_type, resource.id)
+            if key in self.preexisting and key not in self.reused:
+                self.reused.add(key)
+                self.record('reuse', resource_type, resource.id)
+
+        return resources
+
+    def match(self, resource_type, resource, name, value):
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+
+        if name.startswith('tag:'):
+            actual = resource.tags.get(name[4:])
+        elif name == ID_FILTERS.get(resource_type):
+            actual = resource.id
+        elif name in FILTER_ATTRIBUTES:
+            actual = getattr(resource, FILTER_ATTRIBUTES[name], None)
+        else:
+            # Ignore filters that the mock provider does not model.
+            return True
+
+        if isinstance(actual, (list, tuple, set)):
+            return any(fnmatch(str(item), str(pattern)) for item in actual for pattern in values)
+        return actual is not None and any(fnmatch(str(actual), str(pattern)) for pattern in values)
+
+    def seed(self, state):
+        # Populate the provider with the resources recorded by a previous run.
+        def collect(encoded):
+            if 'resource' in encoded:
+                attributes = dict(encoded.get('attributes', {}))
+                resource = MOCK_CLASSES.get(encoded['resource'], MockResource)(id=encoded['id'], **attributes)
+                if encoded['resource'] == 'security_group':
+                    resource.rules, resource.rules_egress = [], []
+                    resource.authorize = lambda *args, **kwargs: True
+                self.add(encoded['resource'], resource, action=None)
+                self.preexisting.add((encoded['resource'], encoded['id']))
+            for item in encoded.get('list', ()):
+                collect(item)
+
+        for node in state.get('nodes', {}).values():
+            for encoded in node['resources'].values():
+                collect(encoded)
+
+        # Every VPC has a main Route Table, even if it was not recorded.
+        for (resource_type, resource_id), resource in list(self.resources.items()):
+            if resource_type == 'vpc' and not self.find('route_table', filters={'vpc-id': resource_id, 'association.main': 'true'}):
+                self.add('route_table', MOCK_CLASSES['route_table'](id=self.generate_id('route_table'), vpc_id=resource_id, routes=[],
+                                                                    associations=[], destinations=[], main='true'), action=None)
+
+    def report(self, output=print):
+        symbols = {'create': '+', 'reuse': '=', 'update': '~', 'delete': '-'}
+        for action, resource_type, identifier in self.actions:
+            output('%s %-6s %s (%s)' % (symbols.get(action, '?'), action, resource_type.replace('_', ' '), identifier))
+
+        totals = Counter(action for action, resource_type, identifier in self.actions)
+        output('Plan: %d to create, %d to reuse, %d to update, %d to delete.' % (totals['create'], totals['reuse'],
+                                                                                totals['update'], totals['delete']))
+
+        calls = Counter()
+        for (service, operation), count in self.calls.items():
+            calls[service] += count
+        output('Predicted API calls: %d (%s).' % (sum(calls.values()),
+                                                 ', '.join('%s: %d' % (service, count) for service, count in sorted(calls.items()))))
+
+provider = MockProvider()
+
+def resource_type_of(operation, prefix):
+    # Derive a resource type from an operation name (e.g., get_all_route_tables -> route_table).
+    resource_type = operation[len(prefix):]
+    if resource_type.endswith('s') and not resource_type.endswith('options'):
+        resource_type = resource_type[:-1]
+    return resource_type
+
+class MockConnection(object):
+    """
+    A stand-in for the boto connections used by :mod:`sky.compute`,
+    :mod:`sky.networking`, :mod:`sky.database`, :mod:`sky.security` and
+    :mod:`sky.storage`, backed by a :class:`MockProvider`.
+    """
+
+    def __init__(self, service, provider=provider):
+        self.service = service
+        self.provider = provider
+
+    def __getattr__(self, operation):
+        if operation.startswith('_'):
+            raise AttributeError(operation)
+
+        handler = getattr(type(self), '_' + operation, None)
+
+        def call(*args, **kwargs):
+            with self.provider.lock:
+                self.provider.calls[(self.service, operation)] += 1
+                if handler:
+                    return handler(self, *args, **kwargs)
+                return self._generic(operation, *args, **kwargs)
+
+        return call
+
+    def _generic(self, operation, *args, **kwargs):
+        if operation.startswith('get_all_'):
+            return self.provider.find(resource_type_of(operation, 'get_all_'),
+                                      ids=args[0] if args else None,
+                                      filters=kwargs.get('filters'))
+        if operation.startswith('create_'):
+            return self.provider.create(resource_type_of(operation, 'create_'), **kwargs)
+        if operation.startswith('delete_'):
+            return self.provider.delete(resource_type_of(operation, 'delete_'), args[0] if args else None)
+
+        # Record any other mutating call, except tagging, as an update.
+        if not operation.startswith(('get_', 'describe_', 'list_')) and 'tags' not in operation:
+            self.provider.record('update', operation, ', '.join(str(arg) for arg in args[:2]))
+        return True
+
+    def _call_method(self, operation, identifier):
+        # Count and record an API call made through a resource object's method.
+        with self.provider.lock:
+            self.provider.calls[(self.service, operation)] += 1
+            self.provider.record('update', operation, identifier)
+        return True
+
+    # Amazon EC2 and Amazon VPC.
+
+    def _get_all_zones(self, zones=None, filters=None):
+        names = zones or DEFAULT_ZONES
+        return [MockResource(name=name, state='available') for name in names]
+
+    def _create_vpc(self, cidr_block, **kwargs):
+        vpc = self.provider.create('vpc', cidr_block=cidr_block, state='available', is_default=False)
+        vpc.vpc_id = vpc.id
+        dhcp_options = self.provider.create('dhcp_options')
+        vpc.dhcp_options_id = dhcp_options.id
+        self.provider.create('security_group', name='default', vpc_id=vpc.id, rules=[], rules_egress=[])
+        self.provider.create('network_acl', vpc_id=vpc.id)
+        main_route_table = self._create_route_table(vpc.id)
+        main_route_table.main = 'true'
+        return vpc
+
+    def _get_all_vpcs(self, vpc_ids=None, filters=None, **kwargs):
+        return self.provider.find('vpc', ids=vpc_ids, filters=filters)
+
+    def _get_all_subnets(self, subnet_ids=None, filters=None, **kwargs):
+        return self.provider.find('subnet', ids=subnet_ids, filters=filters)
+
+    def _create_subnet(self, vpc_id, cidr_block, availability_zone=None, **kwargs):
+        return self.provider.create('subnet', vpc_id=vpc_id, cidr_block=cidr_block, availability_zone=availability_zone,
+                                    state='available')
+
+    def _get_all_security_groups(self, groupnames=None, group_ids=None, filters=None, **kwargs):
+        return self.provider.find('security_group', ids=group_ids, filters=filters)
+
+    def _create_security_group(self, name, description, vpc_id=None, **kwargs):
+        security_group = self.provider.create('security_group', name=name, description=description, vpc_id=vpc_id,
+                                              rules=[], rules_egress=[])
+        security_group.authorize = lambda *args, **kwargs: self._call_method('authorize', security_group.id)
+        return security_group
+
+    def _get_status(self, action, params, path='/', parent=None, verb='GET'):
+        # Batched Security Group rule changes (e.g., AuthorizeSecurityGroupIngress).
+        if not action.startswith(('Authorize', 'Revoke')):
+            return self._generic(action)
+
+        security_group = self.provider.get('security_group', params['GroupId'])
+        if security_group is None:
+            raise boto.exception.EC2ResponseError(400, 'Bad Request', body='<Response><Errors><Error><Code>InvalidGroup.NotFound</Code>' + \
+                                                                           '</Error></Errors></Response>')
+        permissions = security_group.rules if action.endswith('Ingress') else security_group.rules_egress
+
+        # Parse IpPermissions.N.* parameters into one permission per grant.
+        grants = OrderedDict()
+        for key, value in sorted(params.items()):
+            if not key.startswith('IpPermissions.'):
+                continue
+            index, field = key.split('.', 2)[1:]
+            grants.setdefault(index, {})[field] = value
+
+        for fields in grants.values():
+            ports = (str(fields['FromPort']), str(fields['ToPort'])) if 'FromPort' in fields else (None, None)
+            targets = [('cidr_ip', value) for field, value in fields.items() if field.startswith('IpRanges.')] + \
+                      [('group_id', value) for field, value in fields.items() if field.startswith('Groups.')]
+            for attribute, value in targets:
+                grant = {'cidr_ip': None, 'group_id': None}
+                grant[attribute] = value
+                if action.startswith('Authorize'):
+                    permissions.append(MockResource(ip_protocol=fields['IpProtocol'], from_port=ports[0], to_port=ports[1],
+                                                    grants=[MockResource(**grant)]))
+                    continue
+                for permission in list(permissions):
+                    if (str(permission.ip_protocol), permission.from_port, permission.to_port) == (fields['IpProtocol'],) + ports:
+                        permission.grants = [existing for existing in permission.grants \
+                                             if (existing.cidr_ip, existing.group_id) != (grant['cidr_ip'], grant['group_id'])]
+                        if not permission.grants:
+                            permissions.remove(permission)
+
+        self.provider.record('update', re.sub('(?<!^)([A-Z])', r' \1', action).lower(), security_group.id)
+        return True
+
+    def _create_route_table(self, vpc_id, **kwargs):
+        return self.provider.create('route_table', vpc_id=vpc_id, routes=[], associations=[], destinations=[], main='false')
+
+    def _create_route(self, route_table_id, destination_cidr_block, gateway_id=None, instance_id=None, **kwargs):
+        route_table = self.provider.get('route_table', route_table_id)
+        route_table.routes.append(MockResource(destination_cidr_block=destination_cidr_block,
+                                               gateway_id=gateway_id,
+                                               instance_id=instance_id))
+        route_table.destinations.append(destination_cidr_block)
+        self.provider.record('update', 'route_table', route_table_id)
+        return True
+
+    def _associate_route_table(self, route_table_id, subnet_id, **kwargs):
+        # A Subnet may only be associated to one Route Table at a time.
+        for (resource_type, resource_id), route_table in self.provider.resources.items():
+            if resource_type == 'route_table':
+                route_table.associations = [association for association in route_table.associations \
+                                            if association.subnet_id != subnet_id]
+        association_id = self.provider.generate_id('association')
+        self.provider.get('route_table', route_table_id).associations.append(MockResource(id=association_id,
+                                                                                          subnet_id=subnet_id))
+        self.provider.record('update', 'route_table', route_table_id)
+        return association_id
+
+    def _replace_route_table_association_with_assoc(self, association_id, route_table_id, **kwargs):
+        subnet_id = None
+        for (resource_type, resource_id), route_table in self.provider.resources.items():
+            if resource_type == 'route_table':
+                for association in route_table.associations:
+                    if association.id == association_id:
+                        subnet_id = association.subnet_id
+        return self._associate_route_table(route_table_id, subnet_id)
+
+    def _create_internet_gateway(self, **kwargs):
+        return self.provider.create('internet_gateway', vpc_id=None)
+
+    def _attach_internet_gateway(self, internet_gateway_id, vpc_id, **kwargs):
+        self.provider.get('internet_gateway', internet_gateway_id).vpc_id = vpc_id
+        self.provider.record('update', 'internet_gateway', internet_gateway_id)
+        return True
+
+    def _create_tags(self, resource_ids, tags, **kwargs):
+        for resource_id in [resource_ids] if isinstance(resource_ids, str) else resource_ids:
+            for (resource_type, known_id), resource in self.provider.resources.items():
+                if known_id == resource_id:
+                    resource.tags.update(tags)
+        return True
+
+    def _get_all_tags(self, filters=None, **kwargs):
+        resource_id = (filters or {}).get('resource-id')
+        return [MockResource(name=key, value=value) for (resource_type, known_id), resource in self.provider.resources.items() \
+                if known_id == resource_id for key, value in resource.tags.items()]
+
+    def _get_image(self, image_id, **kwargs):
+        return MockResource(id=image_id, name=image_id)
+
+    def _get_all_images(self, image_ids=None, owners=None, filters=None, **kwargs):
+        return [MockResource(id='ami-00000000', name='amzn-ami-vpc-nat-hvm-2015.03.0.x86_64-ebs')]
+
+    def _run_instances(self, image_id, min_count=1, max_count=1, network_interfaces=None, **kwargs):
+        interface = network_interfaces[0] if network_interfaces else None
+        subnet = self.provider.get('subnet', interface.subnet_id) if interface else None
+        groups = [self.provider.get('security_group', group_id) or MockResource(id=group_id) \
+                  for group_id in (interface.groups if interface else [])]
+
+        instances = []
+        for index in range(max_count):
+            instance = self.provider.create('instance', image_id=image_id, state='running',
+                                            subnet_id=subnet.id if subnet else None,
+                                            vpc_id=subnet.vpc_id if subnet else None,
+                                            placement=subnet.availability_zone if subnet else None,
+                                            groups=groups)
+            self.provider.add('network_interface', MockResource(id=self.provider.generate_id('network_interface'),
+                                                                instance_id=instance.id,
+                                                                attachment=MockResource(instance_id=instance.id)), action=None)
+            instances.append(instance)
+
+        return MockResource(id=self.provider.generate_id('reservation'), instances=instances)
+
+    def _get_all_instances(self, instance_ids=None, filters=None, **kwargs):
+        instances = self.provider.find('instance', ids=instance_ids, filters=filters)
+        return [MockResource(id=None, instances=instances)] if instances else []
+
+    def _get_all_network_interfaces(self, network_interface_ids=None, filters=None, **kwargs):
+        return self.provider.find('network_interface', ids=network_interface_ids, filters=filters)
+
+    def _terminate_instances(self, instance_ids=None, **kwargs):
+        return [instance_id for instance_id in instance_ids or () if self.provider.delete('instance', instance_id)]
+
+    # Amazon RDS.
+
+    def _create_db_parameter_group(self, name, family, description=None, **kwargs):
+        self.provider.add('db_parameter_group', MockResource(id=name))
+        return {'CreateDBParameterGroupResponse': {'CreateDBParameterGroupResult': {'DBParameterGroup': {'DBParameterGroupName': name}}}}
+
+    def _create_db_subnet_group(self, name, description, subnet_ids, **kwargs):
+        self.provider.add('db_subnet_group', MockResource(id=name))
+        return {'CreateDBSubnetGroupResponse': {'CreateDBSubnetGroupResult': {'DBSubnetGroup': {'DBSubnetGroupName': name}}}}
+
+    def _create_option_group(self, name, engine_name, major_engine_version, description, **kwargs):
+        self.provider.add('option_group', MockResource(id=name))
+        return {'CreateOptionGroupResponse': {'CreateOptionGroupResult': {'OptionGroup': {'OptionGroupName': name}}}}
+
+    def _create_db_instance(self, name, allocated_storage, db_instance_class, engine, *args, **kwargs):
+        endpoint = {'Address': '%s.mock.rds.amazonaws.com' % name, 'Port': kwargs.get('port') or 5432}
+        self.provider.add('db_instance', MockResource(id=name, endpoint=endpoint))
+        return {'CreateDBInstanceResponse': {'CreateDBInstanceResult': {'DBInstance': {'DBInstanceIdentifier': name}}}}
+
+    def _describe_db_instances(self, db_instance_identifier=None, **kwargs):
+        db_instances = self.provider.find('db_instance', ids=[db_instance_identifier] if db_instance_identifier else None)
+        if not db_instances:
+            raise boto.rds2.exceptions.DBInstanceNotFound(404, 'Not Found', {'__type': 'DBInstanceNotFound'})
+        return {'DescribeDBInstancesResponse': {'DescribeDBInstancesResult': {'DBInstances': [{'DBInstanceIdentifier': db_instance.id,
+                                                                                              'Endpoint': db_instance.endpoint} \
+                                                                                             for db_instance in db_instances]}}}
+
+    # Amazon IAM.
+
+    def _list_instance_profiles_for_role(self, role_name, **kwargs):
+        return {'list_instance_profiles_for_role_response': {'list_instance_profiles_for_role_result': {'instance_profiles': []}}}
+
+    def _list_role_policies(self, role_name, **kwargs):
+        return {'list_role_policies_response': {'list_role_policies_result': {'policy_names': []}}}
+
+    def _create_role(self, role_name, **kwargs):
+        return self.provider.add('role', MockResource(id=role_name, name=role_name))
+
+    def _create_instance_profile(self, instance_profile_name, **kwargs):
+        return self.provider.add('instance_profile', MockResource(id=instance_profile_name, name=instance_profile_name))
+
+    def _get_server_certificate(self, cert_name, **kwargs):
+        certificate = self.provider.find('server_certificate', ids=[cert_name])
+        if not certificate:
+            raise boto.exception.BotoServerError(404, 'Not Found')
+        metadata = {'server_certificate_id': cert_name, 'arn': certificate[-1].arn}
+        return {'get_server_certificate_response': {'get_server_certificate_result': {'server_certificate': {'server_certificate_metadata': metadata}}}}
+
+    def _delete_server_cert(self, cert_name, **kwargs):
+        return self.provider.delete('server_certificate', cert_name)
+
+    def _upload_server_cert(self, cert_name, cert_body, private_key, cert_chain=None, **kwargs):
+        arn = 'arn:aws:iam::000000000000:server-certificate/%s' % cert_name
+        self.provider.add('server_certificate', MockResource(id=cert_name, arn=arn))
+        metadata = {'server_certificate_id': cert_name, 'arn': arn}
+        return {'upload_server_certificate_response': {'upload_server_certificate_result': {'server_certificate_metadata': metadata}}}
+
+    # Amazon S3.
+
+    def _lookup(self, bucket_name, **kwargs):
+        buckets = self.provider.find('bucket', ids=[bucket_name])
+        return buckets[-1] if buckets else None
+
+    def _create_bucket(self, bucket_name, **kwargs):
+        return self.provider.add('bucket', self._build_bucket(bucket_name))
+
+    def _get_bucket(self, bucket_name, validate=True, **kwargs):
+        # Without validation, boto doesn't make a request.
+        if not validate:
+            self.provider.calls[(self.service, 'get_bucket')] -= 1
+        return self._lookup(bucket_name) or self._build_bucket(bucket_name)
+
+    def _build_bucket(self, bucket_name):
+        bucket = MockResource(id=bucket_name, name=bucket_name, keys=OrderedDict(), uploads=OrderedDict())
+        connection = self
+
+        def count(operation):
+            with connection.provider.lock:
+                connection.provider.calls[(connection.service, operation)] += 1
+
+        def generate_id(resource_type):
+            with connection.provider.lock:
+                return connection.provider.generate_id(resource_type)
+
+        def new_key(key_name):
+            key = MockResource(id=key_name, name=key_name, etag='"%s"' % generate_id('etag'), metadata={},
+                               content_type='application/octet-stream', content_encoding=None, cache_control=None,
+                               content_disposition=None, encrypted=None)
+            def set_contents(*args, **kwargs):
+                count('put_object')
+                with connection.provider.lock:
+                    bucket.keys[key_name] = key
+                    connection.provider.record('create', 'object', '%s/%s' % (bucket_name, key_name))
+            key.set_contents_from_filename = key.set_contents_from_file = key.set_contents_from_string = set_contents
+            return key
+
+        def get_all_keys(headers=None, prefix='', marker='', max_keys=1000, **kwargs):
+            count('list_objects')
+            with connection.provider.lock:
+                names = sorted(key_name for key_name in bucket.keys if key_name.startswith(prefix or '') and key_name > (marker or ''))
+                page = MockResultSet(bucket.keys[key_name] for key_name in names[:max_keys])
+            page.is_truncated = len(names) > max_keys
+            return page
+
+        def initiate_multipart_upload(key_name, **kwargs):
+            count('create_multipart_upload')
+            upload = MockResource(id=generate_id('upload'), key_name=key_name, bucket=bucket)
+            def upload_part_from_file(fp, part_num, **kwargs):
+                count('upload_part')
+                return MockResource(id=part_num, etag='"%s"' % generate_id('etag'))
+            def complete_upload():
+                count('complete_multipart_upload')
+                with connection.provider.lock:
+                    bucket.uploads.pop(upload.id, None)
+                    bucket.keys[key_name] = new_key(key_name)
+                    connection.provider.record('create', 'object', '%s/%s' % (bucket_name, key_name))
+            def cancel_upload():
+                count('abort_multipart_upload')
+                bucket.uploads.pop(upload.id, None)
+            upload.upload_part_from_file = upload_part_from_file
+            upload.complete_upload = complete_upload
+            upload.cancel_upload = cancel_upload
+            bucket.uploads[upload.id] = upload
+            return upload
+
+        def get_all_multipart_uploads(prefix=None, **kwargs):
+            count('list_multipart_uploads')
+            return [upload for upload in bucket.uploads.values() if upload.key_name.startswith(prefix or '')]
+
+        bucket.new_key = new_key
+        def get_key(key_name, **kwargs):
+            count('head_object')
+            return bucket.keys.get(key_name)
+
+        def delete_key(key_name, **kwargs):
+            count('delete_object')
+            with connection.provider.lock:
+                if bucket.keys.pop(key_name, None):
+                    connection.provider.record('delete', 'object', '%s/%s' % (bucket_name, key_name))
+
+        def copy_key(new_key_name, src_bucket_name, src_key_name, metadata=None, preserve_acl=False, headers=None, **kwargs):
+            count('copy_object')
+            # Preserving the ACL takes a request to read it and another to write it.
+            if preserve_acl:
+                count('get_object_acl')
+                count('put_object_acl')
+            with connection.provider.lock:
+                key = bucket.keys.get(src_key_name) or new_key(new_key_name)
+                if metadata is not None:
+                    key.metadata = dict(metadata)
+                    key.content_type = (headers or {}).get('Content-Type', 'binary/octet-stream')
+                bucket.keys[new_key_name] = key
+                connection.provider.record('update', 'object', '%s/%s' % (bucket_name, new_key_name))
+            return bucket.keys[new_key_name]
+
+        bucket.get_key = get_key
+        bucket.copy_key = copy_key
+        bucket.delete_key = delete_key
+        bucket.get_all_keys = get_all_keys
+        bucket.list = lambda prefix='', *args, **kwargs: iter(get_all_keys(prefix=prefix, max_keys=len(bucket.keys)))
+        bucket.initiate_multipart_upload = initiate_multipart_upload
+        bucket.get_all_multipart_uploads = get_all_multipart_uploads
+        bucket.configure_lifecycle = lambda *args, **kwargs: True
+        return bucket
+
+    # Amazon ELB.
+
+    def _get_all_load_balancers(self, load_balancer_names=None, **kwargs):
+        return self.provider.find('load_balancer', ids=load_balancer_names)
+
+    def _create_load_balancer(self, name, zones, listeners=None, subnets=None, security_groups=None, **kwargs):
+        load_balancer = self.provider.add('load_balancer', MockResource(id=name, name=name, instances=[],
+                                                                        dns_name='%s.mock.elb.amazonaws.com' % name))
+        load_balancer.get_instance_health = lambda instances=None: [MockResource(instance_id=instance_id, state='InService') \
+                                                                    for instance_id in instances or ()]
+        return load_balancer
+
+    def _delete_load_balancer(self, name, **kwargs):
+        return self.provider.delete('load_balancer', name)
+
+def connect(service):
+    logger.debug('Connecting to the mock %s service.' % service.upper())
+    return MockConnection(service)
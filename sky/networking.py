@@ -1,57 +1,24 @@
 import sys
 import time
-import re
 import ipaddress
 import logging
 from operator import itemgetter
+from concurrent.futures import as_completed
 import boto
+from .connections import get_connection
 from .state import config, mode
+from .deployment import find_resources
+from .waiter import retry
+from .cache import uncached
+from .scheduler import ContextThreadPoolExecutor
+from .ipam import AddressPool
+from .validation import validate_cidr_block, find_overlaps, VPC_NETMASKS
+from .catalog import get_zones
 
 logger = logging.getLogger(__name__)
 
-def connect_vpc():
-    logger.debug('Connecting to the Amazon Virtual Private Cloud (Amazon VPC) service.')
-    vpc = boto.connect_vpc(aws_access_key_id=config['AWS_ACCESS_KEY_ID'],
-                           aws_secret_access_key=config['AWS_SECRET_ACCESS_KEY'])
-    logger.debug('Connected to Amazon VPC.')
-
-    return vpc
-
-def validate_cidr_block(cidr_block):
-    try:
-        logger.debug('Validating CIDR block (%s).' % cidr_block)
-
-        # Split CIDR block into Network IP and Netmask components.
-        network_ip, netmask = itemgetter(0, 1)(cidr_block.split('/'))
-        netmask = int(netmask)
-
-        # Ensure that CIDR block conforms to RFC 1918.
-        assert (re.search(r'^10\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])$', network_ip) or \
-                re.search(r'^172\.(1[6-9]|2[0-9]|3[0-1])\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])$', network_ip) or \
-                re.search(r'^192\.168\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])$', network_ip)) and \
-               (re.search(r'(^[1-2]?[0-9]$)|(^3[0-2]$)', str(netmask)))
-
-        # Validate netmask.
-        if re.search(r'^10\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])$', network_ip):
-            assert netmask >= 8
-            logger.debug('Valid Class A Private Network CIDR block given (%s).' % cidr_block)
-        elif re.search(r'^172\.(1[6-9]|2[0-9]|3[0-1|)\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])$', network_ip):
-            assert netmask >= 12
-            logger.debug('Valid Class B Private Network CIDR block given (%s).' % cidr_block)
-        elif re.search(r'^192\.168\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])\.([0-9]|[1-9][0-9]|[1-2][0-5][0-5])$', network_ip):
-            assert netmask >= 16
-            logger.debug('Valid Class C Private Network CIDR block given (%s).' % cidr_block)
-
-        # Ensure that netmask is compatible with Amazon VPC.
-        if not (netmask >= 16 and netmask <= 28):
-            logger.error('Amazon VPC service requires CIDR block sizes between a /16 netmask and /28 netmask.')
-            assert False
-
-        logger.debug('CIDR block validated (%s).' % cidr_block)
-        return True
-    except AssertionError as error:
-        logger.error('Invalid CIDR block given (%s).' % cidr_block)
-        return False
+def connect_vpc(region=None):
+    return get_connection('vpc', region)
 
 def create_network(name=None, internet_connected=False, **kwargs):
     # Defer import to resolve interdependency between .networking and .compute modules.
@@ -67,9 +34,10 @@ def create_network(name=None, internet_connected=False, **kwargs):
     if not name:
         name = '-'.join(['vpc', config['PROJECT_NAME'], config['ENVIRONMENT']])
 
-    # Check for existing network.
+    # Check for existing network, preferring resources recorded by the previous run.
     if config['CREATION_MODE'] == mode.PERMANENT:
-        existing_vpc = vpc_connection.get_all_vpcs(filters={'tag:Name': name})
+        existing_vpc = find_resources('vpc', tags={'Name': name}) or \
+                       vpc_connection.get_all_vpcs(filters={'tag:Name': name})
         if len(existing_vpc):
             logger.info('Found existing Network (%s).' % name)
             return existing_vpc[-1]
@@ -101,83 +69,48 @@ def create_network(name=None, internet_connected=False, **kwargs):
             logger.error('Error %s: %s. Could not create VPC (%s). %s' % (error.status, error.reason, name, error.message))
 
     # Tag Virtual Private Cloud (VPC).
-    tagged = False
-    while not tagged:
-        try:
-            tagged = ec2_connection.create_tags([network.id], {'Name': name,
-                                                               'Project': config['PROJECT_NAME'],
-                                                               'Environment': config['ENVIRONMENT'],})
-        except boto.exception.EC2ResponseError as error:
-            if error.code == 'InvalidVpcID.NotFound': # VPC hasn't registered with Virtual Private Cloud (VPC) service yet.
-                pass
-            else:
-                raise boto.exception.EC2ResponseError
+    retry(ec2_connection.create_tags, [network.id], {'Name': name,
+                                                     'Project': config['PROJECT_NAME'],
+                                                     'Environment': config['ENVIRONMENT'],},
+          retry_on=['InvalidVpcID.NotFound']) # VPC hasn't registered with Virtual Private Cloud (VPC) service yet.
 
     # Tag default Security Group.
     security_groups = ec2_connection.get_all_security_groups(filters={'vpc-id': network.id,})
     for security_group in security_groups:
-        tagged = False
         security_group_name = '-'.join(['gp', config['PROJECT_NAME'], config['ENVIRONMENT'], 'default'])
-        while not tagged:
-            try:
-                tagged = ec2_connection.create_tags([security_group.id], {'Name': security_group_name,
-                                                                          'Project': config['PROJECT_NAME'],
-                                                                          'Environment': config['ENVIRONMENT'],
-                                                                          'Type': 'default',})
-            except boto.exception.EC2ResponseError as error:
-                if error.code == 'InvalidID': # Security Group hasn't registered with Virtual Private Cloud (VPC) service yet.
-                    pass
-                else:
-                    raise boto.exception.EC2ResponseError
+        retry(ec2_connection.create_tags, [security_group.id], {'Name': security_group_name,
+                                                                'Project': config['PROJECT_NAME'],
+                                                                'Environment': config['ENVIRONMENT'],
+                                                                'Type': 'default',},
+              retry_on=['InvalidID']) # Security Group hasn't registered with Virtual Private Cloud (VPC) service yet.
 
     # Tag Main Route Table.
     route_tables = vpc_connection.get_all_route_tables(filters={'vpc-id': network.id,})
     for route_table in route_tables:
-        tagged = False
         route_table_name = '-'.join(['rtb', config['PROJECT_NAME'], config['ENVIRONMENT'], 'main'])
-        while not tagged:
-            try:
-                tagged = ec2_connection.create_tags([route_table.id], {'Name': route_table_name,
-                                                                       'Project': config['PROJECT_NAME'],
-                                                                       'Environment': config['ENVIRONMENT'],
-                                                                       'Type': 'main',})
-            except boto.exception.EC2ResponseError as error:
-                if error.code == 'InvalidID': # Route Table hasn't registered with Virtual Private Cloud (VPC) service yet.
-                    pass
-                else:
-                    raise boto.exception.EC2ResponseError
+        retry(ec2_connection.create_tags, [route_table.id], {'Name': route_table_name,
+                                                             'Project': config['PROJECT_NAME'],
+                                                             'Environment': config['ENVIRONMENT'],
+                                                             'Type': 'main',},
+              retry_on=['InvalidID']) # Route Table hasn't registered with Virtual Private Cloud (VPC) service yet.
 
     # Tag Access Control Lists (ACLs).
     acls = vpc_connection.get_all_network_acls(filters={'vpc-id': network.id,})
     for acl in acls:
-        tagged = False
         acl_name = '-'.join(['acl', config['PROJECT_NAME'], config['ENVIRONMENT']])
-        while not tagged:
-            try:
-                tagged = ec2_connection.create_tags([acl.id], {'Name': acl_name,
-                                                               'Project': config['PROJECT_NAME'],
-                                                               'Environment': config['ENVIRONMENT'],})
-            except boto.exception.EC2ResponseError as error:
-                if error.code == 'InvalidNetworkAclID.NotFound': # ACL hasn't registered with Virtual Private Cloud (VPC) service yet.
-                    pass
-                else:
-                    raise boto.exception.EC2ResponseError
+        retry(ec2_connection.create_tags, [acl.id], {'Name': acl_name,
+                                                     'Project': config['PROJECT_NAME'],
+                                                     'Environment': config['ENVIRONMENT'],},
+              retry_on=['InvalidNetworkAclID.NotFound']) # ACL hasn't registered with Virtual Private Cloud (VPC) service yet.
 
     # Tag DHCP Options Set.
     dhcp_options = vpc_connection.get_all_dhcp_options(network.dhcp_options_id)
     for dhcp_option in dhcp_options:
-        tagged = False
         dhcp_option_name = '-'.join(['dopt', config['PROJECT_NAME'], config['ENVIRONMENT']])
-        while not tagged:
-            try:
-                tagged = ec2_connection.create_tags([dhcp_option.id], {'Name': dhcp_option_name,
-                                                                       'Project': config['PROJECT_NAME'],
-                                                                       'Environment': config['ENVIRONMENT'],})
-            except boto.exception.EC2ResponseError as error:
-                if error.code == 'InvalidID': # DHCP Options Set hasn't registered with Virtual Private Cloud (VPC) service yet.
-                    pass
-                else:
-                    raise boto.exception.EC2ResponseError
+        retry(ec2_connection.create_tags, [dhcp_option.id], {'Name': dhcp_option_name,
+                                                             'Project': config['PROJECT_NAME'],
+                                                             'Environment': config['ENVIRONMENT'],},
+              retry_on=['InvalidID']) # DHCP Options Set hasn't registered with Virtual Private Cloud (VPC) service yet.
 
     if internet_connected:
         attach_internet_gateway(network)
@@ -198,18 +131,11 @@ def attach_internet_gateway(vpc):
     internet_gateway = vpc_connection.create_internet_gateway(dry_run=False)
 
     # Tag Internet Gateway.
-    tagged = False
     internet_gateway_name = '-'.join(['igw', config['PROJECT_NAME'], config['ENVIRONMENT']])
-    while not tagged:
-        try:
-            tagged = ec2_connection.create_tags([internet_gateway.id], {'Name': internet_gateway_name,
-                                                                        'Project': config['PROJECT_NAME'],
-                                                                        'Environment': config['ENVIRONMENT'],})
-        except boto.exception.EC2ResponseError as error:
-            if error.code == 'InvalidInternetGatewayID.NotFound': # IGW hasn't registered with Virtual Private Cloud (VPC) service yet.
-                pass
-            else:
-                raise boto.exception.EC2ResponseError
+    retry(ec2_connection.create_tags, [internet_gateway.id], {'Name': internet_gateway_name,
+                                                              'Project': config['PROJECT_NAME'],
+                                                              'Environment': config['ENVIRONMENT'],},
+          retry_on=['InvalidInternetGatewayID.NotFound']) # IGW hasn't registered with Virtual Private Cloud (VPC) service yet.
 
     # Get name of VPC.
     vpc_tags = ec2_connection.get_all_tags(filters={'resource-id': vpc.id,
@@ -260,15 +186,9 @@ def create_route_table(vpc, name=None, internet_access=False):
                                     dry_run=False)
 
         # Refresh Route Table.
-        refreshed = False
-        while not refreshed:
-            try:
-                route_table = vpc_connection.get_all_route_tables(route_table.id)
-                route_table = route_table[0] if len(route_table) else None
-                refreshed = True
-            except boto.exception.EC2ResponseError as error:
-                if error.code == 'InvalidRouteTableID.NotFound':
-                    pass
+        route_table = retry(uncached(vpc_connection).get_all_route_tables, route_table.id,
+                            retry_on=['InvalidRouteTableID.NotFound'])
+        route_table = route_table[0] if len(route_table) else None
 
     # Generate Route Table name.
     route_tables = vpc_connection.get_all_route_tables(filters={'vpc-id': vpc.id,})
@@ -285,18 +205,11 @@ def create_route_table(vpc, name=None, internet_access=False):
     route_table.name = name
 
     # Tag Route Table.
-    tagged = False
-    while not tagged:
-        try:
-            tagged = ec2_connection.create_tags([route_table.id], {'Name': route_table.name,
-                                                                   'Project': config['PROJECT_NAME'],
-                                                                   'Environment': config['ENVIRONMENT'],
-                                                                   'Type': 'public' if internet_access else 'private',})
-        except boto.exception.EC2ResponseError as error:
-            if error.code == 'InvalidRouteTableID.NotFound': # Route Table hasn't registered with Virtual Private Cloud (VPC) service yet.
-                pass
-            else:
-                raise boto.exception.EC2ResponseError(error.status, error.reason)
+    retry(ec2_connection.create_tags, [route_table.id], {'Name': route_table.name,
+                                                         'Project': config['PROJECT_NAME'],
+                                                         'Environment': config['ENVIRONMENT'],
+                                                         'Type': 'public' if internet_access else 'private',},
+          retry_on=['InvalidRouteTableID.NotFound']) # Route Table hasn't registered with Virtual Private Cloud (VPC) service yet.
 
     logger.info('Created Route Table (%s).' % route_table.name)
     return route_table
@@ -319,11 +232,13 @@ def create_subnets(vpc, zones='All', count=1, byte_aligned=False, balanced=False
         zones = None
     elif isinstance(zones, str):
         zones = [zone.strip() for zone in zones.lower().split(',')]
-    zones = ec2_connection.get_all_zones(zones)
+    zones = get_zones(ec2_connection, zones)
 
-    # Check for existing Subnets.
+    # Check for existing Subnets, preferring resources recorded by the previous run.
     if config['CREATION_MODE'] == mode.PERMANENT:
-        existing_subnets = vpc_connection.get_all_subnets(filters={'vpc-id': vpc.id,
+        existing_subnets = [subnet for subnet in find_resources('subnet', tags={'Type': 'public' if public else 'private'}, vpc_id=vpc.id) \
+                            if subnet.availability_zone in [zone.name for zone in zones]] or \
+                           vpc_connection.get_all_subnets(filters={'vpc-id': vpc.id,
                                                                    'availability-zone': [zone.name for zone in zones],
                                                                    'tag:Type': 'public' if public else 'private',})
         if len(existing_subnets) > 0:
@@ -332,17 +247,21 @@ def create_subnets(vpc, zones='All', count=1, byte_aligned=False, balanced=False
             return existing_subnets
 
     # Get the number of Subnets in each zone, so that a Subnet name can be computed.
+    offsets = {}
     for zone in zones:
-        offset = len(vpc_connection.get_all_subnets(filters={'vpc-id': vpc.id,
-                                                             'availability-zone': zone.name,
-                                                             'tag:Type': 'public' if public else 'private',}))
-        zone.offset = offset
+        offsets[zone.name] = len(vpc_connection.get_all_subnets(filters={'vpc-id': vpc.id,
+                                                                         'availability-zone': zone.name,
+                                                                         'tag:Type': 'public' if public else 'private',}))
 
     # Get the number of Subnets within the specified VPC.
-    num_subnets = len(vpc_connection.get_all_subnets(filters={'vpc-id': vpc.id,}))
+    vpc_subnets = vpc_connection.get_all_subnets(filters={'vpc-id': vpc.id,})
+    num_subnets = len(vpc_subnets)
 
-    # Calculate Subnet netmask.
-    subnet_netmask = netmask+len(bin(num_subnets+len(zones)*count))-3
+    # Track the VPC's free address space, so that Subnet CIDR blocks never overlap existing Subnets.
+    address_pool = AddressPool(vpc.cidr_block, [subnet.cidr_block for subnet in vpc_subnets])
+
+    # Calculate Subnet netmask, splitting the VPC evenly between the existing and new Subnets.
+    subnet_netmask = netmask+(num_subnets+len(zones)*count-1).bit_length()
 
     if balanced:
         # Balance between network expandability and network size.
@@ -352,14 +271,14 @@ def create_subnets(vpc, zones='All', count=1, byte_aligned=False, balanced=False
         # Align CIDR block to nearest byte, if possible.
         subnet_netmask = subnet_netmask+8-(subnet_netmask%8) if subnet_netmask < 24 else subnet_netmask
 
-    # Create Route Table for Public/Private Subnets.
-    route_table = create_route_table(vpc, internet_access=True) if public else create_route_table(vpc, internet_access=False)
+    # Shrink Subnets further, if the VPC's free address space can't hold the new Subnets otherwise.
+    subnet_netmask = address_pool.fit(len(zones)*count, subnet_netmask, max_prefixlen=VPC_NETMASKS[1])
 
-    # Create Subnets.
-    subnets = list()
+    # Plan Subnets.
+    plan = list()
     for i, zone in enumerate(sorted(zones*count, key=lambda zone: zone.name)):
         # Generate Subnet name.
-        suffix = '-' + str(1+zone.offset+(i%count)).zfill(len(str(zone.offset+count)))
+        suffix = '-' + str(1+offsets[zone.name]+(i%count)).zfill(len(str(offsets[zone.name]+count)))
         subnet_name = '-'.join(['subnet', \
                                 config['PROJECT_NAME'], \
                                 config['ENVIRONMENT'], \
@@ -386,22 +305,53 @@ def create_subnets(vpc, zones='All', count=1, byte_aligned=False, balanced=False
                 continue
             break # Give up.
 
-        # Create Subnet CIDR block.
-        subnet_network_ip = (network_ip | (num_subnets+i << 32-subnet_netmask))
-        subnet_cidr_block = str(subnet_network_ip >> 24) + '.' + \
-                            str((subnet_network_ip >> 16) & 255) + '.' + \
-                            str((subnet_network_ip >> 8) & 255) + '.' + \
-                            str(subnet_network_ip & 255) + '/' + \
-                            str(subnet_netmask)
+        # Allocate Subnet CIDR block.
+        subnet_cidr_block = address_pool.allocate(subnet_netmask)
+
+        # Add Subnet to plan.
+        plan.append((zone, subnet_cidr_block, subnet_name))
 
-        # Create Subnet.
-        subnet = create_subnet(vpc, zone, subnet_cidr_block, subnet_name, route_table)
+    # Reject plans with overlapping CIDR blocks.
+    overlaps = find_overlaps([subnet.cidr_block for subnet in vpc_subnets] + [cidr_block for (zone, cidr_block, subnet_name) in plan])
+    if overlaps:
+        raise RuntimeError('Subnet CIDR blocks overlap (%s).' % ', '.join(['%s and %s' % overlap for overlap in overlaps]))
 
-        # Add Subnet to list.
-        if subnet:
-            subnets.append(subnet)
+    # Create Route Table for Public/Private Subnets.
+    route_table = create_route_table(vpc, internet_access=True) if public else create_route_table(vpc, internet_access=False)
 
-    return subnets
+    # Create Subnets concurrently, collecting results in plan order.
+    subnets = [None]*len(plan)
+    failure = None
+    with ContextThreadPoolExecutor(max_workers=max(1, min(len(plan), config['JOBS'] or 1))) as executor:
+        futures = dict((executor.submit(create_subnet, vpc, zone, cidr_block, subnet_name, route_table), i) \
+                       for i, (zone, cidr_block, subnet_name) in enumerate(plan))
+        for future in as_completed(futures):
+            try:
+                subnets[futures[future]] = future.result()
+            except BaseException as error:
+                logger.error('Couldn\'t create Subnet (%s).' % plan[futures[future]][2])
+                failure = failure or error
+
+    if failure:
+        # Delete Subnets created by this call, leaving pre-existing Subnets untouched.
+        existing_ids = set([subnet.id for subnet in vpc_subnets])
+        for subnet in subnets:
+            if subnet and subnet.id not in existing_ids:
+                logger.info('Deleting Subnet (%s).' % subnet.id)
+                try:
+                    vpc_connection.delete_subnet(subnet.id)
+                except boto.exception.BotoServerError as error:
+                    logger.error('Error %s: %s. Couldn\'t delete Subnet (%s).' % (error.status, error.reason, subnet.id))
+
+        # Delete the Route Table created by this call, now that no Subnets are associated to it.
+        logger.info('Deleting Route Table (%s).' % route_table.id)
+        try:
+            vpc_connection.delete_route_table(route_table.id, dry_run=False)
+        except boto.exception.BotoServerError as error:
+            logger.error('Error %s: %s. Couldn\'t delete Route Table (%s).' % (error.status, error.reason, route_table.id))
+        raise failure
+
+    return [subnet for subnet in subnets if subnet]
 
 def create_subnet(vpc, zone, cidr_block, subnet_name=None, route_table=None):
     # Defer import to resolve interdependency between .networking and .compute modules.
@@ -416,14 +366,15 @@ def create_subnet(vpc, zone, cidr_block, subnet_name=None, route_table=None):
     # Break CIDR block into IP and Netmask components.
     network_ip, netmask = get_cidr_block_components(cidr_block)
 
-    # Check for existing Subnet.
+    # Check for existing Subnet, preferring resources recorded by the previous run.
     if config['CREATION_MODE'] == mode.PERMANENT:
-        existing_subnet = vpc_connection.get_all_subnets(filters={'vpc-id': vpc.id,
+        existing_subnet = find_resources('subnet', tags={'Name': subnet_name}, vpc_id=vpc.id, availability_zone=zone.name, cidr_block=cidr_block) or \
+                          vpc_connection.get_all_subnets(filters={'vpc-id': vpc.id,
                                                                   'availability-zone': zone.name,
                                                                   'cidrBlock' : cidr_block,
                                                                   'tag:Name' : subnet_name,})
         if len(existing_subnet):
-            logger.info('Found existing Subnet (%s).' % existing_subnet.tags['Name'])
+            logger.info('Found existing Subnet (%s).' % existing_subnet[-1].tags['Name'])
             return existing_subnet[-1]
 
     # Create Subnet.
@@ -441,35 +392,37 @@ def create_subnet(vpc, zone, cidr_block, subnet_name=None, route_table=None):
                 num_subnets = len(vpc_connection.get_all_subnets(filters={'vpc-id':vpc.id}))
                 logging.error('%d Subnets exist within the VPC' % num_subnets)
                 logging.error('Refer to the VPC User Guide for Amazon VPC Limits.')
-                sys.exit(1)
-
-    # Associate Subnet to Route Table.
-    public = False
-    if route_table:
-        association_id = vpc_connection.associate_route_table(route_table.id, # route_table_id
-                                                              subnet.id,      # subnet_id
-                                                              dry_run=False)
-        if len(association_id):
-            logger.debug('Subnet (%s) associated to (%s).' % (subnet_name, route_table.id))
-        else:
-            logger.error('Subnet (%s) not associated to (%s).' % (subnet_name, route_table.id))
+        raise RuntimeError('Couldn\'t create Subnet (%s) with CIDR block (%s).' % (subnet_name, cidr_block))
 
-        # Determine Subnet type.
-        public = [route for route in route_table.routes if route.gateway_id and route.destination_cidr_block == '0.0.0.0/0']
-
-    # Tag Subnet.
-    tagged = False
-    while not tagged:
-        try:
-            tagged = ec2_connection.create_tags([subnet.id], {'Name': subnet_name,
-                                                              'Project': config['PROJECT_NAME'],
-                                                              'Environment': config['ENVIRONMENT'],
-                                                              'Type': 'public' if public else 'private',})
-        except boto.exception.EC2ResponseError as error:
-            if error.code == 'InvalidSubnetID.NotFound': # Subnet hasn't registered with Virtual Private Cloud (VPC) service yet.
-                pass
+    # Delete the Subnet if it can't be associated or tagged, so that a failed call doesn't leave it behind.
+    try:
+        # Associate Subnet to Route Table.
+        public = False
+        if route_table:
+            association_id = vpc_connection.associate_route_table(route_table.id, # route_table_id
+                                                                  subnet.id,      # subnet_id
+                                                                  dry_run=False)
+            if len(association_id):
+                logger.debug('Subnet (%s) associated to (%s).' % (subnet_name, route_table.id))
             else:
-                raise boto.exception.EC2ResponseError
+                logger.error('Subnet (%s) not associated to (%s).' % (subnet_name, route_table.id))
+
+            # Determine Subnet type.
+            public = [route for route in route_table.routes if route.gateway_id and route.destination_cidr_block == '0.0.0.0/0']
+
+        # Tag Subnet.
+        retry(ec2_connection.create_tags, [subnet.id], {'Name': subnet_name,
+                                                        'Project': config['PROJECT_NAME'],
+                                                        'Environment': config['ENVIRONMENT'],
+                                                        'Type': 'public' if public else 'private',},
+              retry_on=['InvalidSubnetID.NotFound']) # Subnet hasn't registered with Virtual Private Cloud (VPC) service yet.
+    except BaseException:
+        logger.info('Deleting Subnet (%s).' % subnet.id)
+        try:
+            vpc_connection.delete_subnet(subnet.id)
+        except boto.exception.BotoServerError as error:
+            logger.error('Error %s: %s. Couldn\'t delete Subnet (%s).' % (error.status, error.reason, subnet.id))
+        raise
 
     return subnet
 
@@ -0,0 +1,222 @@
+import re
+import logging
+import ipaddress
+from collections import namedtuple, OrderedDict
+from .waiter import retry
+from .validation import is_cidr_block
+
+logger = logging.getLogger(__name__)
+
+# Matches a port range (e.g., 8000-8080).
+PORT_RANGE = re.compile(r'^(\d+)\-(\d+)$')
+
+# Protocols and ports of named traffic types.
+TRAFFIC_TYPES = {
+    'HTTP':  [('tcp', 80, 80)],
+    'HTTPS': [('tcp', 443, 443)],
+    'DNS':   [('tcp', 53, 53), ('udp', 53, 53)],
+}
+
+# Amazon EC2 API actions, by direction.
+AUTHORIZE_ACTIONS = {
+    'inbound':  'AuthorizeSecurityGroupIngress',
+    'outbound': 'AuthorizeSecurityGroupEgress',
+}
+
+REVOKE_ACTIONS = {
+    'inbound':  'RevokeSecurityGroupIngress',
+    'outbound': 'RevokeSecurityGroupEgress',
+}
+
+# A single permission: a protocol and port range, granted to either a CIDR block or a Security Group.
+Rule = namedtuple('Rule', ['protocol', 'from_port', 'to_port', 'cidr_ip', 'group_id'])
+
+def parse_rules(traffic):
+    """
+    Convert a list of ``(protocol, cidr_block)`` or ``(protocol, security_group)``
+    tuples, as accepted by :func:`sky.compute.create_security_group`, into a
+    list of :class:`Rule` objects.
+    """
+    rules = list()
+    for (protocol, target) in traffic:
+        protocol = protocol.upper()
+
+        # Determine whether target is a CIDR block or a Security Group.
+        if is_cidr_block(target):
+            cidr_ip, group_id = str(target), None
+        else:
+            cidr_ip, group_id = None, getattr(target, 'id', target)
+
+        # Determine port range for TCP and UDP rules.
+        if protocol in TRAFFIC_TYPES:
+            permissions = TRAFFIC_TYPES[protocol]
+        elif protocol[:4] in ['TCP:', 'UDP:']:
+            protocol, port = protocol.split(':', 1)
+            port_range = PORT_RANGE.match(port)
+            from_port, to_port = (int(port_range.group(1)), int(port_range.group(2))) if port_range else (int(port), int(port))
+            permissions = [(protocol.lower(), from_port, to_port)]
+        else:
+            raise RuntimeError('Unsupported traffic type (%s).' % protocol)
+
+        for (ip_protocol, from_port, to_port) in permissions:
+            rules.append(Rule(ip_protocol, from_port, to_port, cidr_ip, group_id))
+
+    return rules
+
+def merge_port_ranges(rules):
+    # Merge overlapping and contiguous port ranges of rules that share a protocol and target.
+    targets = OrderedDict()
+    for rule in rules:
+        targets.setdefault((rule.protocol, rule.cidr_ip, rule.group_id), []).append(rule)
+
+    merged = list()
+    for (protocol, cidr_ip, group_id), target_rules in targets.items():
+        if protocol == '-1' or any(rule.from_port is None for rule in target_rules):
+            merged.extend(target_rules)
+            continue
+        ranges = list()
+        for rule in sorted(target_rules, key=lambda rule: (rule.from_port, rule.to_port)):
+            if ranges and rule.from_port <= ranges[-1][1] + 1:
+                ranges[-1][1] = max(ranges[-1][1], rule.to_port)
+            else:
+                ranges.append([rule.from_port, rule.to_port])
+        merged.extend(Rule(protocol, from_port, to_port, cidr_ip, group_id) for (from_port, to_port) in ranges)
+    return merged
+
+def collapse_cidr_blocks(rules):
+    # Aggregate adjacent and overlapping CIDR blocks of rules that share a protocol and port range.
+    permissions = OrderedDict()
+    for rule in rules:
+        permissions.setdefault((rule.protocol, rule.from_port, rule.to_port), []).append(rule)
+
+    collapsed = list()
+    for (protocol, from_port, to_port), permission_rules in permissions.items():
+        networks = [ipaddress.ip_network(rule.cidr_ip, strict=False) for rule in permission_rules if rule.cidr_ip]
+        collapsed.extend(Rule(protocol, from_port, to_port, str(network), None) for network in ipaddress.collapse_addresses(networks))
+        collapsed.extend(rule for rule in permission_rules if rule.group_id)
+    return collapsed
+
+def compact_rules(rules):
+    """
+    Remove duplicate rules, merge port ranges and aggregate CIDR blocks until
+    the rule set no longer shrinks, so that fewer rules count towards the
+    Security Group's rule limit.
+    """
+    compacted = list(OrderedDict.fromkeys(rules))
+    while True:
+        result = list(OrderedDict.fromkeys(collapse_cidr_blocks(merge_port_ranges(compacted))))
+        if len(result) >= len(compacted):
+            break
+        compacted = result
+
+    return sorted(compacted, key=lambda rule: (rule.protocol, rule.from_port or 0, rule.to_port or 0, rule.cidr_ip or '', rule.group_id or ''))
+
+def get_existing_rules(permissions):
+    # Convert boto IPPermissions objects (e.g., SecurityGroup.rules) into Rule objects.
+    rules = list()
+    for permission in permissions or []:
+        all_ports = str(permission.ip_protocol) == '-1' or permission.from_port in (None, '', '-1')
+        from_port = None if all_ports else int(permission.from_port)
+        to_port = None if all_ports else int(permission.to_port)
+        for grant in permission.grants:
+            rules.append(Rule(str(permission.ip_protocol), from_port, to_port, getattr(grant, 'cidr_ip', None), getattr(grant, 'group_id', None)))
+    return rules
+
+def build_permissions(rules):
+    # Group rules by protocol and port range into IpPermissions request parameters.
+    permissions = OrderedDict()
+    for rule in rules:
+        permissions.setdefault((rule.protocol, rule.from_port, rule.to_port), []).append(rule)
+
+    params = {}
+    for i, ((protocol, from_port, to_port), grants) in enumerate(permissions.items(), 1):
+        prefix = 'IpPermissions.%d.' % i
+        params[prefix + 'IpProtocol'] = protocol
+        if from_port is not None:
+            params[prefix + 'FromPort'] = from_port
+            params[prefix + 'ToPort'] = to_port
+        for j, cidr_ip in enumerate([grant.cidr_ip for grant in grants if grant.cidr_ip], 1):
+            params[prefix + 'IpRanges.%d.CidrIp' % j] = cidr_ip
+        for j, group_id in enumerate([grant.group_id for grant in grants if grant.group_id], 1):
+            params[prefix + 'Groups.%d.GroupId' % j] = group_id
+    return params
+
+def describe_rule(rule):
+    if rule.protocol == '-1':
+        return 'all'
+    if rule.from_port is None:
+        ports = 'all'
+    elif rule.from_port == rule.to_port:
+        ports = 'Port %d' % rule.from_port
+    else:
+        ports = 'Ports %d-%d' % (rule.from_port, rule.to_port)
+    return '%s %s' % (rule.protocol.upper(), ports)
+
+def resolve_groups(ec2_connection, rules):
+    # Verify that every referenced Security Group exists, using a single describe call.
+    group_ids = sorted(set([rule.group_id for rule in rules if rule.group_id]))
+    if group_ids:
+        found = set([group.id for group in ec2_connection.get_all_security_groups(group_ids=group_ids)])
+        missing = [group_id for group_id in group_ids if group_id not in found]
+        if missing:
+            raise RuntimeError('The referenced Security Group(s) could not be found (%s).' % ', '.join(missing))
+    return group_ids
+
+def covers(rule, other):
+    # Determine whether a rule grants everything that another rule grants.
+    if rule.protocol != '-1' and rule.protocol != other.protocol:
+        return False
+    if other.group_id or rule.group_id:
+        if other.group_id != rule.group_id:
+            return False
+    else:
+        network, other_network = ipaddress.ip_network(rule.cidr_ip, strict=False), ipaddress.ip_network(other.cidr_ip, strict=False)
+        if network.version != other_network.version or not other_network.subnet_of(network):
+            return False
+    if rule.protocol == '-1' or rule.from_port is None:
+        return True
+    return other.from_port is not None and rule.from_port <= other.from_port and other.to_port <= rule.to_port
+
+def apply_rules(ec2_connection, security_group, inbound_rules, outbound_rules, revoke=False):
+    """
+    Bring a Security Group's rules in line with lists of inbound and outbound
+    :class:`Rule` objects, authorizing missing rules with at most one request
+    per direction. Existing rules are compacted before they're compared, so
+    that rules that are split differently, but grant the same traffic, aren't
+    authorized again.
+
+    :type revoke: bool
+    :param revoke: Whether to revoke existing rules that aren't covered by
+        the given rules, with at most one request per direction. Rules may
+        have been added by hand or by other tools, so they're kept by default.
+    """
+    desired = {
+        'inbound':  inbound_rules,
+        'outbound': outbound_rules,
+    }
+    existing = {
+        'inbound':  get_existing_rules(getattr(security_group, 'rules', None)),
+        'outbound': get_existing_rules(getattr(security_group, 'rules_egress', None)),
+    }
+
+    for direction in ['inbound', 'outbound']:
+        # Revoke only whole existing rules, so the rules that are kept are compacted after revocation is decided.
+        revoked = [rule for rule in OrderedDict.fromkeys(existing[direction]) \
+                   if revoke and not any(covers(desired_rule, rule) for desired_rule in desired[direction])]
+        kept = compact_rules([rule for rule in existing[direction] if rule not in revoked])
+        authorized = [rule for rule in OrderedDict.fromkeys(desired[direction]) if not any(covers(kept_rule, rule) for kept_rule in kept)]
+
+        # Authorize new rules before revoking old rules, so that traffic isn't interrupted.
+        for (actions, rules, verb) in [(AUTHORIZE_ACTIONS, authorized, 'allowed'), (REVOKE_ACTIONS, revoked, 'revoked')]:
+            if not rules:
+                continue
+            params = build_permissions(rules)
+            params['GroupId'] = security_group.id
+            retry(ec2_connection.get_status, actions[direction], params, verb='POST',
+                  retry_on=['InvalidGroup.NotFound']) # Security Group hasn't registered with EC2 service yet.
+            for rule in rules:
+                logger.info('Security Group (%s) %s %s %s traffic %s %s.' % (security_group.name, verb, direction, describe_rule(rule),
+                                                                             'from' if direction == 'inbound' else 'to', rule.cidr_ip or rule.group_id))
+
+        logger.debug('Security Group (%s) has %d %s rule(s): %d authorized, %d revoked.' % (security_group.name, len(desired[direction]),
+                                                                                         direction, len(authorized), len(revoked)))
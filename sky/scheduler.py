@@ -0,0 +1,91 @@
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .state import ready, config
+
+logger = logging.getLogger(__name__)
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    A :class:`concurrent.futures.ThreadPoolExecutor` that runs each submitted
+    callable within a copy of the submitting thread's context, so that
+    context-scoped settings (e.g., ``config['CREATION_MODE']``) carry over to
+    worker threads.
+    """
+
+    def submit(self, function, *args, **kwargs):
+        context = contextvars.copy_context()
+        return super(ContextThreadPoolExecutor, self).submit(context.run, function, *args, **kwargs)
+
+def execute(nodes, jobs=None):
+    """
+    Execute a set of :class:`sky.infrastructure.Infrastructure` objects
+    concurrently, starting each node as soon as its own requisite
+    infrastructure has been built.
+
+    :type nodes: list
+    :param nodes: The :class:`sky.infrastructure.Infrastructure` objects to
+        build. Requisite infrastructure that is not in this list is considered
+        to be already built.
+
+    :type jobs: int
+    :param jobs: The maximum number of nodes to build at once. Defaults to
+        ``config['JOBS']``.
+
+    :rtype: dict
+    :return: A dictionary mapping node names to ``(start, finish)`` times, in
+        seconds relative to the start of execution.
+    """
+    jobs = max(1, int(jobs or config['JOBS'] or 1))
+
+    # Index nodes by name, and count the unbuilt dependencies of each node.
+    nodes_by_name = {node.__name__: node for node in nodes}
+    dependents = {name: [] for name in nodes_by_name}
+    pending = {}
+    for name, node in nodes_by_name.items():
+        dependencies = {dependency for dependency in (node.dependencies or set()) if dependency in nodes_by_name}
+        pending[name] = len(dependencies)
+        for dependency in dependencies:
+            dependents[dependency].append(name)
+
+    timings = {}
+    start_time = time.perf_counter()
+
+    def build(node):
+        timings[node.__name__] = (time.perf_counter() - start_time, None)
+        logger.debug('Building (%s) at %.3fs.' % (node.__name__, timings[node.__name__][0]))
+        node()
+        timings[node.__name__] = (timings[node.__name__][0], time.perf_counter() - start_time)
+        logger.debug('Built (%s) at %.3fs in %.3fs.' % (node.__name__, timings[node.__name__][1],
+                                                       timings[node.__name__][1] - timings[node.__name__][0]))
+        return node
+
+    error = None
+    with ContextThreadPoolExecutor(max_workers=jobs) as executor:
+        running = {executor.submit(build, nodes_by_name[name]) for name, count in pending.items() if not count}
+
+        while running:
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                try:
+                    node = future.result()
+                except Exception as exception:
+                    # Stop scheduling new nodes, but allow running nodes to finish.
+                    logger.error('Could not build infrastructure: %s' % exception)
+                    error = error or exception
+                    continue
+
+                ready[node.__name__] = node
+
+                # Schedule the dependents that have no remaining unbuilt dependencies.
+                if not error:
+                    for name in dependents[node.__name__]:
+                        pending[name] -= 1
+                        if not pending[name]:
+                            running.add(executor.submit(build, nodes_by_name[name]))
+
+    if error:
+        raise error
+
+    return timings
@@ -2,17 +2,13 @@ import time
 import random
 import logging
 import boto
+from .connections import get_connection
 from .state import config, mode
 
 logger = logging.getLogger(__name__)
 
-def connect_iam():
-    logger.debug('Connecting to the Amazon Identity and Access Management (Amazon IAM) service.')
-    iam = boto.connect_iam(aws_access_key_id=config['AWS_ACCESS_KEY_ID'],
-                           aws_secret_access_key=config['AWS_SECRET_ACCESS_KEY'])
-    logger.debug('Connected to Amazon IAM.')
-
-    return iam
+def connect_iam(region=None):
+    return get_connection('iam', region)
 
 def delete_role(role_name):
     # Connect to the Amazon Identity and Access Management (Amazon IAM) service.
@@ -117,7 +113,8 @@ def create_role(inline_policies):
         iam_connection.put_role_policy(role_name, role_policy_name, inline_policy)
 
     # Allow time for Role to register with Amazon IAM service.
-    time.sleep(5) # Required 5-second sleep.
+    if not config['DRY_RUN']:
+        time.sleep(5) # Required 5-second sleep.
     return instance_profile
 
 def upload_ssl_certificate(public_key, private_key, certificate_chain=None, name=None):
@@ -186,7 +183,8 @@ def upload_ssl_certificate(public_key, private_key, certificate_chain=None, name
                            ['upload_server_certificate_result']\
                            ['server_certificate_metadata']\
                            ['arn']
-        time.sleep(5) # required 5-second sleep
+        if not config['DRY_RUN']:
+            time.sleep(5) # required 5-second sleep
     except boto.exception.BotoServerError as error:
         if error.status == 400: # Bad Request
             logger.error('Couldn\'t upload server certificate (%s) due to an issue with its contents and/or formatting Error %s: %s.' % (name, error.status, error.reason))
@@ -1,6 +1,7 @@
 import os
 import sys
 from enum import Enum
+from contextvars import ContextVar
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,7 +25,31 @@ ready = ReadyObject()
 
 mode = Enum('Mode', 'NONE EPHEMERAL PERMANENT CUSTOM')
 
-config = {
+class ConfigObject(dict):
+
+    # Settings that are scoped to the running Infrastructure object, rather than to the process.
+    _context_variables = {
+        'CREATION_MODE': ContextVar('CREATION_MODE', default=None),
+    }
+
+    def __getitem__(self, key):
+        if key in self._context_variables:
+            return self._context_variables[key].get()
+        return super(ConfigObject, self).__getitem__(key)
+
+    def __setitem__(self, key, value):
+        if key in self._context_variables:
+            self._context_variables[key].set(value)
+        else:
+            super(ConfigObject, self).__setitem__(key, value)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+config = ConfigObject({
     'PROJECT_NAME':          None,
     'PROJECT_DIRECTORY':     None,
     'ENVIRONMENT':           None,
@@ -32,4 +57,10 @@ config = {
     'AWS_ACCESS_KEY_ID':     None,
     'AWS_SECRET_ACCESS_KEY': None,
     'CREATION_MODE':         None,
-}
+    'JOBS':                  4,
+    'FORCE':                 [],
+    'DRY_RUN':               False,
+    'COMMAND':               None,
+    'CATALOG_TTL':           None,
+    'S3_ENDPOINT':           None,
+})
@@ -1,18 +1,39 @@
+import io
+import copy
 import os
+import json
+import math
+import time
 import random
+import hashlib
 import logging
+from concurrent.futures import as_completed, wait, CancelledError, FIRST_COMPLETED
 import boto
+import boto.exception
+import boto.s3.connection
+import boto.s3.lifecycle
+from .archive import write_archive, get_archive_digest
+from .connections import get_connection
+from .scheduler import ContextThreadPoolExecutor
+from .waiter import get_delay
 from .state import config
 
 logger = logging.getLogger(__name__)
 
-def connect_s3():
-    logger.debug('Connecting to the Amazon Simple Storage Service (Amazon S3).')
-    s3 = boto.connect_s3(aws_access_key_id=config['AWS_ACCESS_KEY_ID'],
-                         aws_secret_access_key=config['AWS_SECRET_ACCESS_KEY'])
-    logger.debug('Connected to Amazon S3.')
+MULTIPART_THRESHOLD = 16 * 1024 * 1024 # Files larger than this are uploaded in parts, in bytes.
+PART_SIZE = 8 * 1024 * 1024            # Default part size, in bytes.
+MIN_PART_SIZE = 5 * 1024 * 1024        # Amazon S3 rejects smaller parts, except for the last part.
+PART_ATTEMPTS = 5                      # Attempts per part before an upload is abandoned.
 
-    return s3
+ARTIFACT_EXPIRATION = 30 # Days before an artifact that no deployment has used expires.
+ARTIFACT_PREFIX = 'artifacts/'
+
+LIST_PAGE_SIZE = 1000        # Keys per listing request; Amazon S3 returns at most 1,000.
+MAX_POLICY_RESOURCES = 20    # Resources per directory (and per policy) before they collapse into a wildcard.
+MAX_POLICY_SIZE = 10240      # Characters allowed in an IAM role's inline policies.
+
+def connect_s3(region=None):
+    return get_connection('s3', region)
 
 def create_bucket():
     s3_connection = connect_s3()
@@ -33,12 +54,364 @@ def create_bucket():
 
     return bucket
 
-def add_object(bucket, obj):
-    key = bucket.new_key(obj)
-    key.set_contents_from_filename(obj, policy='private')
+def get_artifact_bucket():
+    """
+    Get (or create) the project's artifact bucket. Unlike the buckets made by
+    :func:`create_bucket`, its name is stable across deployments and
+    environments, so that artifacts that haven't changed aren't uploaded
+    again.
+    """
+    s3_connection = connect_s3()
+    s3_bucket_name = '-'.join(str(part) for part in ['s3', config['PROJECT_NAME'], 'artifacts', config['AWS_ACCOUNT_ID']] if part).lower()
+    bucket = s3_connection.lookup(s3_bucket_name)
+    if not bucket:
+        lifecycle_config = boto.s3.lifecycle.Lifecycle()
+        lifecycle_config.add_rule(id='expire-artifacts', prefix=ARTIFACT_PREFIX, status='Enabled', expiration=ARTIFACT_EXPIRATION)
+        logger.info('Creating S3 bucket (%s).' % s3_bucket_name)
+        bucket = s3_connection.create_bucket(s3_bucket_name, location=boto.s3.connection.Location.DEFAULT, policy='private')
+        bucket.configure_lifecycle(lifecycle_config)
+        logger.info('Created S3 bucket (%s).' % s3_bucket_name)
+    return bucket
+
+def add_object(bucket, obj, key_name=None, part_size=PART_SIZE, jobs=None, threshold=MULTIPART_THRESHOLD):
+    """
+    Upload a file to an S3 bucket. Files larger than ``threshold`` bytes are
+    uploaded in parts of ``part_size`` bytes by up to ``jobs`` workers (by
+    default, ``config['JOBS']``), retrying each part on its own. Interrupted
+    uploads are resumed from a manifest kept in ``.sky/uploads``.
+    """
+    key_name = key_name or obj
+
+    if os.path.getsize(obj) <= max(threshold, part_size):
+        key = bucket.new_key(key_name)
+        key.set_contents_from_filename(obj, policy='private')
+    else:
+        upload_multipart(bucket, obj, key_name, part_size=part_size, jobs=jobs)
+
+def get_manifest_path(bucket_name, key_name, filename):
+    # Keep one manifest per file, bucket and key alongside the deployment state.
+    digest = hashlib.sha256('\0'.join([bucket_name, key_name, os.path.abspath(filename)]).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(os.getcwd(), '.sky', 'uploads', '%s.json' % digest)
+
+def save_manifest(path, manifest):
+    # Dry runs don't record uploads to the in-memory provider.
+    if config['DRY_RUN']:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(temporary_path, path)
+
+def load_manifest(path, **expected):
+    # Load a manifest, if it describes an upload of the same file.
+    try:
+        with open(path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (FileNotFoundError, ValueError):
+        return None
+    return manifest if all(manifest.get(field) == value for field, value in expected.items()) else None
+
+def find_multipart_upload(bucket, key_name, upload_id):
+    # Find an incomplete multipart upload that was started by a previous run.
+    for upload in bucket.get_all_multipart_uploads(prefix=key_name):
+        if upload.key_name == key_name and upload.id == upload_id:
+            return upload
+    return None
+
+def upload_part(upload, filename, part_number, part_size):
+    with open(filename, 'rb') as source:
+        source.seek((part_number - 1) * part_size)
+        data = source.read(part_size)
+    return send_part(upload, part_number, data)
+
+def send_part(upload, part_number, data):
+    # Connect to the Amazon Simple Storage Service (Amazon S3) with this worker's own connection.
+    upload = copy.copy(upload)
+    upload.bucket = connect_s3().get_bucket(upload.bucket.name, validate=False)
+
+    # Retry each part on its own, so that a transient error doesn't fail the whole upload.
+    for attempt in range(1, PART_ATTEMPTS + 1):
+        try:
+            key = upload.upload_part_from_file(io.BytesIO(data), part_number, size=len(data))
+            return (key.etag, len(data))
+        except (boto.exception.BotoServerError, boto.exception.BotoClientError, OSError) as error:
+            if attempt == PART_ATTEMPTS:
+                raise
+            logger.warning('Retrying part %d of (%s) after %s (attempt %d).' % (part_number, upload.key_name, error, attempt))
+            time.sleep(get_delay(attempt, delay=1))
+
+def upload_multipart(bucket, filename, key_name, part_size=PART_SIZE, jobs=None):
+    part_size = max(int(part_size), MIN_PART_SIZE)
+    jobs = max(1, int(jobs or config['JOBS'] or 1))
+    stat = os.stat(filename)
+    num_parts = int(math.ceil(stat.st_size / float(part_size)))
+
+    # Resume the upload recorded in the manifest, if the file hasn't changed since.
+    manifest_path = get_manifest_path(bucket.name, key_name, filename)
+    manifest = load_manifest(manifest_path, bucket=bucket.name, key=key_name, size=stat.st_size, mtime=stat.st_mtime, part_size=part_size)
+    upload = find_multipart_upload(bucket, key_name, manifest['upload_id']) if manifest else None
+    if upload:
+        # Trust the parts Amazon S3 has received over the parts recorded in the manifest.
+        parts = {str(part.part_number): part.etag for part in upload}
+        logger.info('Resuming upload of (%s) with %d of %d parts already uploaded.' % (key_name, len(parts), num_parts))
+    else:
+        upload = bucket.initiate_multipart_upload(key_name, policy='private')
+        parts = {}
+        logger.info('Uploading (%s) in %d parts of %s bytes.' % (key_name, num_parts, '{:,}'.format(part_size)))
+    manifest = {'bucket': bucket.name, 'key': key_name, 'size': stat.st_size, 'mtime': stat.st_mtime, 'part_size': part_size,
+                'upload_id': upload.id, 'parts': parts}
+    save_manifest(manifest_path, manifest)
+
+    # Upload the remaining parts concurrently, recording each part in the manifest as it completes.
+    start = time.monotonic()
+    uploaded = 0
+    failure = None
+    with ContextThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(upload_part, upload, filename, part_number, part_size): part_number \
+                   for part_number in range(1, num_parts + 1) if str(part_number) not in parts}
+        for future in as_completed(futures):
+            try:
+                etag, size = future.result()
+            except CancelledError:
+                continue
+            except Exception as error:
+                logger.error('Could not upload part %d of (%s): %s' % (futures[future], key_name, error))
+                failure = failure or error
+                for pending in futures:
+                    pending.cancel()
+                continue
+
+            parts[str(futures[future])] = etag
+            save_manifest(manifest_path, manifest)
+
+            uploaded += size
+            elapsed = max(time.monotonic() - start, 1e-6)
+            logger.info('Uploaded part %d of (%s): %d/%d parts, %.1f MiB/s.' % (futures[future], key_name, len(parts), num_parts,
+                                                                                uploaded / elapsed / (1024 * 1024)))
+
+    if failure:
+        logger.error('Upload of (%s) interrupted; it will resume from (%s).' % (key_name, manifest_path))
+        raise failure
+
+    # Assemble the parts into the object.
+    upload.complete_upload()
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    elapsed = max(time.monotonic() - start, 1e-6)
+    logger.info('Uploaded (%s): %s bytes in %.2fs (%.1f MiB/s).' % (key_name, '{:,}'.format(stat.st_size), elapsed,
+                                                                    uploaded / elapsed / (1024 * 1024)))
+
+class MultipartWriter(object):
+    """
+    A write-only file object that uploads its input to an S3 key in parts of
+    ``part_size`` bytes on ``jobs`` threads, so that a stream (e.g., an
+    archive as it is built) is uploaded without a temporary file. A stream
+    that fits in a single part is uploaded with a single request.
+
+    At most ``jobs`` parts are in flight at once, so memory use doesn't grow
+    with the size of the stream. Unlike :func:`add_object`, an interrupted
+    stream can't be resumed, so its upload is aborted.
+    """
 
-def get_bucket_policy(bucket):
-    arns = ['"arn:aws:s3:::'+bucket.name+'/'+key.name+'"' for key in bucket.get_all_keys()]
+    def __init__(self, bucket, key_name, part_size=PART_SIZE, jobs=None):
+        self.bucket = bucket
+        self.key_name = key_name
+        self.part_size = max(int(part_size), MIN_PART_SIZE)
+        self.jobs = max(1, int(jobs or config['JOBS'] or 1))
+        self.buffer = bytearray()
+        self.upload = None
+        self.executor = None
+        self.pending = set()
+        self.part_number = 0
+        self.size = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer += data
+        self.size += len(data)
+        # Hold back a full part until more data arrives, so the last part is never empty.
+        while len(self.buffer) > self.part_size:
+            self._send(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def _send(self, data):
+        if self.upload is None:
+            self.upload = self.bucket.initiate_multipart_upload(self.key_name, policy='private')
+            self.executor = ContextThreadPoolExecutor(max_workers=self.jobs)
+            logger.info('Streaming (%s) to S3 bucket (%s) in parts of %s bytes.' % (self.key_name, self.bucket.name, '{:,}'.format(self.part_size)))
+
+        self.part_number += 1
+        self.pending.add(self.executor.submit(send_part, self.upload, self.part_number, data))
+        while len(self.pending) >= self.jobs:
+            done, self.pending = wait(self.pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.upload is None:
+            key = self.bucket.new_key(self.key_name)
+            key.set_contents_from_string(bytes(self.buffer), policy='private')
+        else:
+            try:
+                if self.buffer:
+                    self._send(bytes(self.buffer))
+                for future in as_completed(self.pending):
+                    future.result()
+            except Exception:
+                self.abort()
+                raise
+            self.executor.shutdown()
+            self.upload.complete_upload()
+        del self.buffer[:]
+        logger.info('Uploaded (%s): %s bytes in %d part(s).' % (self.key_name, '{:,}'.format(self.size), max(1, self.part_number)))
+
+    def abort(self):
+        self.closed = True
+        if self.upload is not None:
+            for future in self.pending:
+                future.cancel()
+            self.executor.shutdown()
+            self.upload.cancel_upload()
+            logger.warning('Aborted upload of (%s).' % self.key_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+def add_archive(bucket, source_dir, key_name, patterns=None, jobs=None):
+    """
+    Stream a gzipped tarball of a directory into an S3 bucket, without
+    writing it to disk. See :func:`sky.archive.write_archive`.
+    """
+    with MultipartWriter(bucket, key_name, jobs=jobs) as writer:
+        entries, size, compressed_size, digest = write_archive(source_dir, writer, patterns=patterns, jobs=jobs)
+    logger.info('Archived directory (%s) to (%s): %d entries, %s bytes compressed to %s bytes.' % \
+                (source_dir, key_name, entries, '{:,}'.format(size), '{:,}'.format(compressed_size)))
+    return digest
+
+def add_artifact(bucket, source_dir, patterns=None, jobs=None):
+    """
+    Upload a directory as a content-addressed artifact, named by the SHA-256
+    digest of its deterministic tarball (e.g., ``artifacts/<digest>.tar.gz``).
+    The upload is skipped if the bucket already holds the artifact.
+
+    :rtype: string
+    :return: The artifact's key name.
+    """
+    digest = get_archive_digest(source_dir, patterns)
+    key_name = '%s%s.tar.gz' % (ARTIFACT_PREFIX, digest)
+
+    # Check for the artifact with a HEAD request.
+    key = bucket.get_key(key_name)
+    if key:
+        # Copy the artifact onto itself, since Amazon S3 expires objects by the time they were last written. A copy
+        # replaces the object's metadata and headers, so the existing ones are sent along with it, and its ACL is kept.
+        headers = {header: value for (header, value) in [('Content-Type', key.content_type),
+                                                         ('Content-Encoding', key.content_encoding),
+                                                         ('Cache-Control', key.cache_control),
+                                                         ('Content-Disposition', key.content_disposition)] if value}
+        try:
+            bucket.copy_key(key_name, bucket.name, key_name, metadata=dict(key.metadata, digest=digest), headers=headers,
+                            preserve_acl=True, encrypt_key=bool(key.encrypted))
+            logger.info('Found artifact (%s) of directory (%s) in S3 bucket (%s); skipped upload.' % (key_name, source_dir, bucket.name))
+            return key_name
+        except boto.exception.S3ResponseError as error:
+            logger.warning('Error %s: %s. Couldn\'t refresh artifact (%s); uploading it again.' % (error.status, error.reason, key_name))
+
+    # Guard against the directory changing between hashing it and uploading it.
+    uploaded_digest = add_archive(bucket, source_dir, key_name, patterns=patterns, jobs=jobs)
+    if uploaded_digest != digest:
+        bucket.delete_key(key_name)
+        raise RuntimeError('Directory (%s) changed while it was uploaded as artifact (%s).' % (source_dir, key_name))
+    return key_name
+
+def iter_keys(bucket, prefix='', page_size=LIST_PAGE_SIZE):
+    """
+    Lazily iterate over the keys in a bucket (or under a prefix), in
+    lexicographic order, requesting one page of keys at a time.
+    """
+    marker = ''
+    while True:
+        page = bucket.get_all_keys(prefix=prefix, marker=marker, max_keys=page_size)
+        for key in page:
+            yield key
+        if not len(page) or not page.is_truncated:
+            return
+        marker = page[-1].name
+
+def get_policy_resources(key_names, max_resources=MAX_POLICY_RESOURCES, prefix=''):
+    """
+    Reduce key names, in lexicographic order, to at most ``max_resources``
+    key names and prefix wildcards (e.g., ``static/*``).
+
+    Keys are grouped by directory, and a directory that would take more than
+    ``max_resources`` entries to list is replaced by a wildcard. Since keys
+    in a directory are listed together, a single pass holding only the
+    directories along the current key's path suffices, whatever the number
+    of keys.
+
+    :type prefix: string
+    :param prefix: The prefix that the key names were listed under. No
+        wildcard is shorter than it, so that a wildcard never covers keys
+        that weren't listed (e.g., ``static/img*``, not ``static/*``).
+
+    :rtype: list
+    :return: A list of key names and wildcards, relative to the bucket.
+    """
+    # Each open directory is a [prefix, resources, collapsed] list, from the root down.
+    directories = [['', [], False]]
+
+    def add(directory, resources):
+        if directory[2]:
+            return
+        directory[1].extend(resources)
+        if len(directory[1]) > max_resources:
+            directory[1], directory[2] = [], True
+
+    def wildcard(directory_prefix):
+        # Clamp the wildcard of a directory that contains the listed prefix to the prefix itself.
+        return (prefix if prefix.startswith(directory_prefix) else directory_prefix) + '*'
+
+    def close():
+        directory_prefix, resources, collapsed = directories.pop()
+        add(directories[-1], [wildcard(directory_prefix)] if collapsed else resources)
+
+    for key_name in key_names:
+        # Close the directories that the key isn't in.
+        while len(directories) > 1 and not key_name.startswith(directories[-1][0]):
+            close()
+
+        # Open the key's directories beneath them, unless a wildcard already covers the key.
+        for name in key_name[len(directories[-1][0]):].split('/')[:-1]:
+            if directories[-1][2]:
+                break
+            directories.append([directories[-1][0] + name + '/', [], False])
+        add(directories[-1], [key_name])
+
+    while len(directories) > 1:
+        close()
+    directory_prefix, resources, collapsed = directories[0]
+    return [wildcard(directory_prefix)] if collapsed else resources
+
+def get_bucket_policy(bucket, prefix='', max_resources=MAX_POLICY_RESOURCES):
+    """
+    Build a policy that allows reading the keys in a bucket (or under a
+    prefix), listing the keys lazily and collapsing them into wildcards where
+    listing them would be costlier (see :func:`get_policy_resources`).
+    """
+    resources = get_policy_resources((key.name for key in iter_keys(bucket, prefix)), max_resources=max_resources, prefix=prefix)
+    arns = [json.dumps('arn:aws:s3:::' + bucket.name + '/' + resource) for resource in resources]
     policy = """{
         "Version": "2012-10-17",
         "Statement": [{
@@ -48,5 +421,10 @@ def get_bucket_policy(bucket):
             ],
             "Resource": [%s]
         }]
-    }""" % ','.join(arns)
-    return policy
+    }"""
+
+    # Fall back to a wildcard for the whole prefix, if the policy would be too large.
+    if len(policy % ','.join(arns)) > MAX_POLICY_SIZE:
+        arns = [json.dumps('arn:aws:s3:::' + bucket.name + '/' + prefix + '*')]
+    logger.debug('Bucket policy for (%s) allows %d resource(s).' % (bucket.name, len(arns)))
+    return policy % ','.join(arns)
@@ -1,13 +1,18 @@
 import os
 import sys
-import tarfile
+import ssl
+import math
+import time
+import socket
 import logging
 from string import Template
 from re import search, IGNORECASE
+from statistics import median
+from urllib.parse import urlsplit
 from argparse import ArgumentParser
 from configparser import ConfigParser
-from timeit import Timer
 from boto import regioninfo
+from .archive import write_archive
 from .state import config
 
 logger = logging.getLogger(__name__)
@@ -20,26 +25,98 @@ def get_script(region, s3bucket, s3object, filename='user-data.sh'):
         s3object=s3object
     )
 
-def get_closest_region(service='ec2', repetitions=1):
-    regions = [region.name for region in regioninfo.get_regions(service) if 'gov' not in region.name and 'cn' not in region.name]
+def probe_endpoint(endpoint, timeout=5):
+    """
+    Measure the latency of an endpoint URL (e.g., ``https://ec2.us-east-1.amazonaws.com``).
 
+    :rtype: tuple
+    :return: The time taken to connect (TCP, plus TLS for ``https`` URLs) and
+        the time from sending a request to receiving the first byte of the
+        response, in seconds.
+    """
+    url = urlsplit(endpoint)
+    secure = url.scheme == 'https'
+    port = url.port or (443 if secure else 80)
+
+    start = time.perf_counter()
+    connection = socket.create_connection((url.hostname, port), timeout=timeout)
+    try:
+        if secure:
+            connection = ssl.create_default_context().wrap_socket(connection, server_hostname=url.hostname)
+        connected = time.perf_counter()
+
+        connection.sendall(('HEAD / HTTP/1.1\r\nHost: %s\r\nConnection: close\r\n\r\n' % url.hostname).encode('ascii'))
+        if not connection.recv(1):
+            raise ConnectionError('No response from (%s).' % endpoint)
+        first_byte = time.perf_counter()
+    finally:
+        connection.close()
+
+    return (connected - start, first_byte - connected)
+
+def get_percentile(values, percentile):
+    # Nearest-rank percentile of a list of values.
+    values = sorted(values)
+    return values[max(0, int(math.ceil(percentile / 100.0 * len(values))) - 1)]
+
+def get_closest_region(service='ec2', repetitions=1, endpoints=None, timeout=5, jobs=16):
+    """
+    Find the AWS region with the lowest latency, probing every region's
+    endpoint concurrently. The result is kept in the catalog, so that later
+    runs don't need to probe again.
+
+    :type repetitions: int
+    :param repetitions: The number of times to probe each region. Regions are
+        ranked by their median latency, then by their 90th percentile latency.
+
+    :type endpoints: dict
+    :param endpoints: An *optional* mapping of region names to endpoint URLs
+        (e.g., ``{'local': 'http://127.0.0.1:8080'}``) to probe instead of the
+        service's regional endpoints. Results for custom endpoints aren't
+        cached.
+    """
+    # Defer import to resolve interdependency between .utils and .catalog modules.
+    from . import catalog
+    from .scheduler import ContextThreadPoolExecutor
+
+    if endpoints is None:
+        regions = [region.name for region in regioninfo.get_regions(service) if 'gov' not in region.name and 'cn' not in region.name]
+        return catalog.lookup('closest_region', '%s:%d' % (service, repetitions), 'global',
+                              lambda: get_closest_region(service, repetitions,
+                                                         endpoints={region: 'https://%s.%s.amazonaws.com' % (service, region) for region in regions},
+                                                         timeout=timeout, jobs=jobs))
+
+    # Probe all endpoints concurrently.
     latency = {}
-    for region in regions:
-        connection = Timer("h.request('GET', '/')",
-                           "from http.client import HTTPSConnection; h=HTTPSConnection('ec2.%s.amazonaws.com')" % region)
-        times = connection.repeat(repetitions, 1)
-        avg_latency = sum(times)/float(len(times))
-        latency[region] = avg_latency
-        logger.info('Average latency to Amazon %s %s is %s' % (service.upper(), region, latency[region]))
-
-    region = min(latency, key=latency.get)
+    with ContextThreadPoolExecutor(max_workers=max(1, min(jobs, len(endpoints) * repetitions))) as executor:
+        probes = [(region, executor.submit(probe_endpoint, endpoint, timeout)) for region, endpoint in sorted(endpoints.items()) for i in range(repetitions)]
+        for region, probe in probes:
+            try:
+                sample = probe.result()
+                latency.setdefault(region, []).append(sample)
+            except (OSError, ssl.SSLError) as error:
+                logger.warning('Could not probe Amazon %s %s (%s).' % (service.upper(), region, error))
+
+    statistics = {}
+    for region, times in latency.items():
+        connect, first_byte, total = [[sample[0] for sample in times], [sample[1] for sample in times], [sum(sample) for sample in times]]
+        statistics[region] = (median(total), get_percentile(total, 90))
+        logger.info('Latency to Amazon %s %s is %.1fms (p90 %.1fms): connect %.1fms (p90 %.1fms), first byte %.1fms (p90 %.1fms).' % \
+                    (service.upper(), region, statistics[region][0] * 1000, statistics[region][1] * 1000,
+                     median(connect) * 1000, get_percentile(connect, 90) * 1000, median(first_byte) * 1000, get_percentile(first_byte, 90) * 1000))
+
+    if not statistics:
+        raise RuntimeError('Could not probe any Amazon %s region.' % service.upper())
+
+    region = min(statistics, key=statistics.get)
     return region
 
-def make_tarfile(output_filename, source_dir):
+def make_tarfile(output_filename, source_dir, patterns=None, jobs=None):
     logger.info('Archiving directory (%s).' % source_dir)
-    with tarfile.open(output_filename, "w:gz") as tar:
-        tar.add(source_dir, arcname='.')
-    logger.info('Created gzipped tarball (%s).' % output_filename)
+    with open(output_filename, 'wb') as output:
+        entries, size, compressed_size, digest = write_archive(source_dir, output, patterns=patterns, jobs=jobs)
+    logger.info('Created gzipped tarball (%s): %d entries, %s bytes compressed to %s bytes.' % \
+                (output_filename, entries, '{:,}'.format(size), '{:,}'.format(compressed_size)))
 
 def configure_logger(args):
     # Restrict the boto logger to the WARNING log level.
@@ -56,8 +133,8 @@ def parse_arguments():
     
     valid_arguments = True
     parser = ArgumentParser(description='Provision Django application environments.')
-    parser.add_argument('command', metavar='<command>', action='store', help='Valid commands are [deploy]')
-    parser.add_argument('targets', metavar='<targets>', action='store', nargs='*', default=['all'], help='Skyfile Targets')
+    parser.add_argument('command', metavar='<command>', action='store', help='Valid commands are [deploy, catalog]')
+    parser.add_argument('targets', metavar='<targets>', action='store', nargs='*', default=['all'], help='Skyfile Targets (catalog: [refresh])')
     parser.add_argument('-p', '--project', dest='directory', action='store', default=os.getcwd(),
                         help='set Django project directory')
     parser.add_argument('-env', '--environment', dest='environment', action='store', default='STAGING',
@@ -71,7 +148,15 @@ def parse_arguments():
     parser.add_argument('-d', '--log', dest='loglevel', action='store', default='ERROR',
                         help='set log level [DEBUG, INFO, WARNING, ERROR, CRITICAL] (default: ERROR)')
     parser.add_argument('--dry', dest='dry_run', action='store_true', default=False,
-                        help='perform a dry run')
+                        help='print a deployment plan without contacting AWS')
+    parser.add_argument('-f', '--force', dest='force', metavar='NODE', action='append', default=[],
+                        help='re-run an infrastructure object even if it is unchanged (may be repeated)')
+    parser.add_argument('-j', '--jobs', dest='jobs', action='store', type=int, default=config['JOBS'],
+                        help='set the maximum number of infrastructure objects to build at once (default: %d)' % config['JOBS'])
+    parser.add_argument('--catalog-ttl', dest='catalog_ttl', metavar='SECONDS', action='store', type=int, default=None,
+                        help='set how long cached AMI and Availability Zone lookups stay fresh (default: per lookup type)')
+    parser.add_argument('--s3-endpoint', dest='s3_endpoint', metavar='URL', action='store', default=os.environ.get('S3_ENDPOINT'),
+                        help='set an S3-compatible endpoint to upload artifacts to (default: Amazon S3)')
 
     # Display help, if no command was supplied.
     if len(sys.argv) == 1:
@@ -91,12 +176,28 @@ def parse_arguments():
     configure_logger(args)
 
     try:
-        assert args.command.upper() in ['DEPLOY']
+        assert args.command.upper() in ['DEPLOY', 'CATALOG']
         logger.debug('Command argument validated (%s).' % args.command)
     except AssertionError:
         logger.error('Invalid command (%s).' % args.command)
         valid_arguments = False
 
+    try:
+        if args.command.upper() == 'CATALOG':
+            assert args.targets in [['all'], ['refresh']]
+            args.targets = ['refresh']
+            logger.debug('Catalog action argument validated (%s).' % args.targets[0])
+    except AssertionError:
+        logger.error('Invalid catalog action (%s). Valid actions are [refresh].' % ' '.join(args.targets))
+        valid_arguments = False
+
+    try:
+        assert args.catalog_ttl is None or args.catalog_ttl >= 0
+        logger.debug('Catalog TTL argument validated (%s).' % args.catalog_ttl)
+    except AssertionError:
+        logger.error('Catalog TTL must not be negative (%d).' % args.catalog_ttl)
+        valid_arguments = False
+
     try:
         assert args.environment.upper() in ['STAGING', 'PROD', 'PRODUCTION']
         if args.environment.upper() == 'PRODUCTION': args.environment = 'PROD'
@@ -105,6 +206,13 @@ def parse_arguments():
         logger.error('Invalid deployment environment (%s).' % args.environment)
         valid_arguments = False
 
+    try:
+        assert args.jobs > 0
+        logger.debug('Jobs argument validated (%d).' % args.jobs)
+    except AssertionError:
+        logger.error('Number of jobs must be at least 1 (%d).' % args.jobs)
+        valid_arguments = False
+
     try:
         assert os.path.isdir(os.path.expanduser(args.directory))
         logger.debug('Django project directory argument validated (%s).' % args.directory)
@@ -171,7 +279,13 @@ def parse_arguments():
         logger.error('Exiting...')
         sys.exit(1)
 
+    config['COMMAND'] = args.command.lower()
     config['TARGETS'] = args.targets
+    config['CATALOG_TTL'] = args.catalog_ttl
+    config['S3_ENDPOINT'] = args.s3_endpoint
+    config['JOBS'] = args.jobs
+    config['FORCE'] = args.force
+    config['DRY_RUN'] = args.dry_run
     config['PROJECT_NAME'] = os.path.abspath(os.path.expanduser(args.directory)).split(os.sep)[-1].lower()
     config['PROJECT_DIRECTORY'] = os.path.abspath(os.path.expanduser(args.directory)).lower()
     config['ENVIRONMENT'] = args.environment.lower()
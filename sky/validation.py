@@ -0,0 +1,96 @@
+import logging
+import ipaddress
+
+logger = logging.getLogger(__name__)
+
+# RFC 1918 private address ranges as (first address, last address, shortest netmask, description).
+PRIVATE_NETWORKS = [
+    (int(ipaddress.IPv4Address('10.0.0.0')),    int(ipaddress.IPv4Address('10.255.255.255')),  8,  'Class A Private Network'),
+    (int(ipaddress.IPv4Address('172.16.0.0')),  int(ipaddress.IPv4Address('172.31.255.255')),  12, 'Class B Private Network'),
+    (int(ipaddress.IPv4Address('192.168.0.0')), int(ipaddress.IPv4Address('192.168.255.255')), 16, 'Class C Private Network'),
+]
+
+# Amazon VPC accepts CIDR blocks between a /16 netmask and a /28 netmask.
+VPC_NETMASKS = (16, 28)
+
+def parse_cidr_block(cidr_block):
+    # Parse an IPv4 CIDR block (e.g., 10.0.0.0/16), returning None if it isn't one.
+    if not isinstance(cidr_block, str) or '/' not in cidr_block:
+        return None
+    try:
+        return ipaddress.IPv4Network(cidr_block, strict=False)
+    except ValueError:
+        return None
+
+def is_cidr_block(value):
+    return parse_cidr_block(value) is not None
+
+def get_private_network(network):
+    # Classify a network by the RFC 1918 range that contains it, using integer comparisons.
+    first, last = int(network.network_address), int(network.broadcast_address)
+    for (start, end, netmask, description) in PRIVATE_NETWORKS:
+        if start <= first and last <= end and network.prefixlen >= netmask:
+            return description
+    return None
+
+def validate_cidr_block(cidr_block):
+    """
+    Check that a CIDR block lies within an RFC 1918 private address range and
+    has a netmask that Amazon VPC accepts.
+
+    :rtype: bool
+    :return: ``True`` if the CIDR block is valid.
+    """
+    logger.debug('Validating CIDR block (%s).' % cidr_block)
+
+    network = parse_cidr_block(cidr_block)
+    description = get_private_network(network) if network else None
+    if not description:
+        logger.error('Invalid CIDR block given (%s).' % cidr_block)
+        return False
+    logger.debug('Valid %s CIDR block given (%s).' % (description, cidr_block))
+
+    # Ensure that netmask is compatible with Amazon VPC.
+    if not VPC_NETMASKS[0] <= network.prefixlen <= VPC_NETMASKS[1]:
+        logger.error('Amazon VPC service requires CIDR block sizes between a /%d netmask and /%d netmask.' % VPC_NETMASKS)
+        logger.error('Invalid CIDR block given (%s).' % cidr_block)
+        return False
+
+    logger.debug('CIDR block validated (%s).' % cidr_block)
+    return True
+
+def find_overlaps(cidr_blocks):
+    """
+    Find overlapping CIDR blocks by sorting them by first address and sweeping
+    once, in O(n log n).
+
+    :rtype: list
+    :return: A list of ``(cidr_block, cidr_block)`` tuples, each pairing a CIDR
+        block with an earlier CIDR block that it overlaps.
+    """
+    networks = sorted((int(network.network_address), int(network.broadcast_address), cidr_block) \
+                      for (cidr_block, network) in ((cidr_block, parse_cidr_block(cidr_block)) for cidr_block in cidr_blocks) if network)
+
+    overlaps = list()
+    widest = None # The block that reaches furthest so far.
+    for (first, last, cidr_block) in networks:
+        if widest and first <= widest[1]:
+            overlaps.append((widest[2], cidr_block))
+        if not widest or last > widest[1]:
+            widest = (first, last, cidr_block)
+    return overlaps
+
+def validate_cidr_blocks(cidr_blocks):
+    """
+    Validate a plan of CIDR blocks, checking each block with
+    :func:`validate_cidr_block` and rejecting blocks that overlap.
+
+    :rtype: bool
+    :return: ``True`` if every CIDR block is valid and no CIDR blocks overlap.
+    """
+    cidr_blocks = list(cidr_blocks)
+    valid = all([validate_cidr_block(cidr_block) for cidr_block in cidr_blocks])
+    for (cidr_block, overlapping_cidr_block) in find_overlaps(cidr_blocks):
+        logger.error('CIDR block (%s) overlaps CIDR block (%s).' % (overlapping_cidr_block, cidr_block))
+        valid = False
+    return valid
@@ -0,0 +1,108 @@
+import time
+import random
+import logging
+import threading
+import boto.exception
+
+logger = logging.getLogger(__name__)
+
+# Error codes that indicate the account is being throttled, and should always be retried.
+THROTTLING_ERRORS = ['Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'RequestThrottled']
+
+DELAY = 0.25      # Initial delay between attempts, in seconds.
+MAX_DELAY = 15    # Maximum delay between attempts, in seconds.
+TIMEOUT = 600     # Deadline for a wait, in seconds.
+
+_statistics_lock = threading.Lock()
+statistics = []
+
+class WaitTimeout(RuntimeError):
+    pass
+
+def get_delay(attempt, delay=DELAY, max_delay=MAX_DELAY):
+    # Back off exponentially, adding jitter so that concurrent waiters do not retry in lock-step.
+    backoff = min(max_delay, delay * 2 ** (attempt - 1))
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+def wait_until(function, condition=bool, description=None, retry_on=(), delay=DELAY, max_delay=MAX_DELAY, timeout=TIMEOUT):
+    """
+    Call a function until its result satisfies a condition, backing off
+    exponentially (with jitter) between attempts.
+
+    :type function: callable
+    :param function: A callable that takes no arguments.
+
+    :type condition: callable
+    :param condition: A callable that accepts the function's result and returns
+        ``True`` when waiting should stop. By default, waits for a truthy result.
+
+    :type description: string
+    :param description: An *optional* description of what is being waited for.
+
+    :type retry_on: list
+    :param retry_on: AWS error codes (e.g., ``InvalidVpcID.NotFound``) that
+        should be retried, rather than raised. Throttling errors are always
+        retried.
+
+    :type timeout: float
+    :param timeout: The number of seconds after which
+        :class:`sky.waiter.WaitTimeout` is raised.
+
+    :return: The first result that satisfied the condition.
+    """
+    description = description or getattr(function, '__name__', 'operation')
+    start = time.monotonic()
+    deadline = start + timeout
+    attempt = 0
+
+    while True:
+        attempt += 1
+        try:
+            result = function()
+            if condition(result):
+                break
+            logger.debug('Waiting for %s (attempt %d)...' % (description, attempt))
+        except boto.exception.BotoServerError as error:
+            if error.code not in retry_on and error.code not in THROTTLING_ERRORS:
+                raise
+            logger.debug('Retrying %s after %s (attempt %d).' % (description, error.code, attempt))
+
+        sleep = get_delay(attempt, delay=delay, max_delay=max_delay)
+        if time.monotonic() + sleep > deadline:
+            record(description, attempt, time.monotonic() - start)
+            raise WaitTimeout('Timed out waiting for %s after %d attempt(s) in %.1fs.' % (description, attempt, time.monotonic() - start))
+        time.sleep(sleep)
+
+    record(description, attempt, time.monotonic() - start)
+    return result
+
+def retry(function, *args, retry_on=(), description=None, delay=DELAY, max_delay=MAX_DELAY, timeout=TIMEOUT, **kwargs):
+    """
+    Call a function until it succeeds, retrying the given AWS error codes
+    (and throttling errors) with exponential backoff. Returns the function's
+    result.
+
+    See also: :func:`sky.waiter.wait_until`.
+    """
+    return wait_until(lambda: function(*args, **kwargs),
+                      condition=lambda result: True,
+                      description=description or getattr(function, '__name__', None),
+                      retry_on=retry_on,
+                      delay=delay,
+                      max_delay=max_delay,
+                      timeout=timeout)
+
+def record(description, attempts, waited):
+    with _statistics_lock:
+        statistics.append((description, attempts, waited))
+    if attempts > 1:
+        logger.info('Waited for %s: %d attempts in %.2fs.' % (description, attempts, waited))
+    else:
+        logger.debug('Waited for %s: 1 attempt in %.2fs.' % (description, waited))
+
+def get_wait_statistics():
+    # Summarize all waits as (waits, attempts, seconds waited).
+    with _statistics_lock:
+        return (len(statistics),
+                sum(attempts for description, attempts, waited in statistics),
+                sum(waited for description, attempts, waited in statistics))
@@ -0,0 +1,104 @@
+import unittest
+from collections import Counter
+from sky.cache import DescribeCache, CachedConnection
+
+class FakeResource(object):
+
+    def __init__(self, id, connection, **attributes):
+        self.id = id
+        self.connection = connection
+        self.__dict__.update(attributes)
+
+class FakeConnection(object):
+    # Counts the requests that reach the service.
+
+    def __init__(self):
+        self.calls = Counter()
+
+    def get_all_vpcs(self, filters=None):
+        self.calls['get_all_vpcs'] += 1
+        return [FakeResource('vpc-%d' % self.calls['get_all_vpcs'], self)]
+
+    def get_all_subnets(self, filters=None):
+        self.calls['get_all_subnets'] += 1
+        return [FakeResource('subnet-%d' % self.calls['get_all_subnets'], self)]
+
+    def get_all_reservations(self):
+        self.calls['get_all_reservations'] += 1
+        return [FakeResource('r-1', self, instances=[FakeResource('i-1', self)])]
+
+    def get_all_load_balancers(self):
+        self.calls['get_all_load_balancers'] += 1
+        return [FakeResource('elb-1', self)]
+
+    def create_vpc(self, cidr_block):
+        return FakeResource('vpc-new', self)
+
+    def create_tags(self, resource_ids, tags):
+        return True
+
+    def create_load_balancer_listeners(self, name, listeners):
+        return True
+
+class DescribeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = DescribeCache()
+        self.raw = FakeConnection()
+        self.connection = CachedConnection(self.raw, 'vpc', cache=self.cache)
+
+    def test_reads_are_cached(self):
+        self.assertEqual(self.connection.get_all_vpcs()[0].id, 'vpc-1')
+        self.assertEqual(self.connection.get_all_vpcs()[0].id, 'vpc-1')
+        self.assertEqual(self.raw.calls['get_all_vpcs'], 1)
+        self.assertEqual(self.cache.statistics['hits'], 1)
+
+        # Different arguments are cached separately.
+        self.connection.get_all_vpcs(filters={'tag:Name': 'vpc-proj'})
+        self.assertEqual(self.raw.calls['get_all_vpcs'], 2)
+
+    def test_writes_invalidate(self):
+        self.connection.get_all_vpcs()
+        self.connection.create_vpc('10.0.0.0/16')
+        self.assertEqual(self.connection.get_all_vpcs()[0].id, 'vpc-2')
+
+        connection = CachedConnection(self.raw, 'elb', cache=self.cache)
+        connection.get_all_load_balancers()
+        connection.create_load_balancer_listeners('elb-1', [])
+        connection.get_all_load_balancers()
+        self.assertEqual(self.raw.calls['get_all_load_balancers'], 2)
+
+    def test_tags_invalidate_tagged_types(self):
+        self.connection.get_all_vpcs()
+        self.connection.get_all_subnets()
+        self.connection.create_tags(['subnet-1'], {'Name': 'subnet-proj'})
+        self.connection.get_all_vpcs()
+        self.connection.get_all_subnets()
+        self.assertEqual(self.raw.calls, Counter(get_all_vpcs=1, get_all_subnets=2))
+
+    def test_stale_results_are_not_stored(self):
+        # A write that lands while a result loads makes the result stale, so it's returned but not stored.
+        def loader():
+            result = self.raw.get_all_vpcs()
+            self.cache.invalidate('ec2', ['vpc'])
+            return result
+
+        self.cache.get('ec2', 'get_all_vpcs', (), {}, loader)
+        self.connection.get_all_vpcs()
+        self.assertEqual(self.raw.calls['get_all_vpcs'], 2)
+
+    def test_hits_are_bound_to_the_callers_connection(self):
+        # Each thread has a connection of its own, so objects loaded by one thread are served to another as copies.
+        other_raw = FakeConnection()
+        other_connection = CachedConnection(other_raw, 'vpc', cache=self.cache)
+
+        reservation = self.connection.get_all_reservations()[0]
+        other_reservation = other_connection.get_all_reservations()[0]
+        self.assertIs(reservation.connection, self.raw)
+        self.assertIs(other_reservation.connection, other_raw)
+        self.assertIs(other_reservation.instances[0].connection, other_raw)
+        self.assertIs(reservation.instances[0].connection, self.raw)
+        self.assertEqual(other_raw.calls['get_all_reservations'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from sky.state import config, mode
+from sky.cache import describe_cache
+from sky import mock, networking, compute
+
+ZONES = 'us-east-1a,us-east-1b,us-east-1c'
+
+class CreateNatInstancesTest(unittest.TestCase):
+
+    def setUp(self):
+        # Plan against the in-memory provider.
+        config.update(DRY_RUN=True, PROJECT_NAME='proj', ENVIRONMENT='staging')
+        config['CREATION_MODE'] = mode.PERMANENT
+        mock.provider.__init__()
+        describe_cache.clear()
+        self.vpc = networking.create_network(network_class='b')
+        self.public_subnets = networking.create_subnets(self.vpc, zones=ZONES, public=True)
+        self.private_subnets = networking.create_subnets(self.vpc, zones=ZONES)
+
+    def tearDown(self):
+        config['CREATION_MODE'] = None
+
+    def get_running_instances(self):
+        return [instance for instance in mock.provider.find('instance') if instance.state == 'running']
+
+    def test_existing_nat_instances_are_reused(self):
+        nat_instances = compute.create_nat_instances(self.vpc, self.public_subnets, self.private_subnets)
+        self.assertEqual(compute.create_nat_instances(self.vpc, self.public_subnets, self.private_subnets), nat_instances)
+        self.assertEqual(len(self.get_running_instances()), 3)
+
+    def test_failed_launches_are_terminated(self):
+        # When one NAT instance can't be launched, the NAT instances launched in the other zones are terminated.
+        modifications = []
+        def fail_second(connection, instance_id, *args, **kwargs):
+            modifications.append(instance_id)
+            if len(modifications) == 2:
+                raise RuntimeError('Modification failed.')
+            return True
+
+        mock.MockConnection._modify_instance_attribute = fail_second
+        try:
+            with self.assertRaises(RuntimeError):
+                compute.create_nat_instances(self.vpc, self.public_subnets, self.private_subnets)
+        finally:
+            del mock.MockConnection._modify_instance_attribute
+
+        self.assertEqual(len(modifications), 3)
+        self.assertEqual(self.get_running_instances(), [])
+
+if __name__ == '__main__':
+    unittest.main()
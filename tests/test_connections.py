@@ -0,0 +1,24 @@
+import unittest
+from sky.state import config
+from sky.scheduler import ContextThreadPoolExecutor
+from sky.connections import get_connection
+
+def get_connection_in_pool(service):
+    with ContextThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(get_connection, service).result()
+
+class GetConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        config.update(DRY_RUN=True)
+
+    def test_connections_are_kept_per_thread(self):
+        self.assertIs(get_connection('ec2'), get_connection('ec2'))
+        self.assertIsNot(get_connection('rds'), get_connection_in_pool('rds'))
+
+    def test_connections_outlive_thread_pools(self):
+        # A connection made by the worker of a finished pool is handed to the worker of the next pool.
+        self.assertIs(get_connection_in_pool('elb'), get_connection_in_pool('elb'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from sky.infrastructure import Infrastructure
+from sky.deployment import restore_nodes
+
+SKYFILE = """
+CIDR_BLOCK = %r
+ZONES = {'us-east-1a', 'us-east-1b'}
+
+def get_cidr_block():
+    return CIDR_BLOCK
+
+def network():
+    return get_cidr_block(), sorted(ZONES)
+"""
+
+def load_node(cidr_block):
+    namespace = {}
+    exec(SKYFILE % cidr_block, namespace)
+    return Infrastructure(namespace['network'])
+
+def make_closure_node(count):
+    def web():
+        return count
+    return Infrastructure(web)
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_fingerprint_is_stable(self):
+        self.assertEqual(load_node('10.0.0.0/16').get_fingerprint(), load_node('10.0.0.0/16').get_fingerprint())
+
+    def test_fingerprint_covers_globals(self):
+        # A changed Skyfile constant, read through a helper function, changes the fingerprint.
+        self.assertNotEqual(load_node('10.0.0.0/16').get_fingerprint(), load_node('10.1.0.0/16').get_fingerprint())
+
+    def test_fingerprint_covers_closures(self):
+        self.assertNotEqual(make_closure_node(1).get_fingerprint(), make_closure_node(2).get_fingerprint())
+
+class RestoreNodesTest(unittest.TestCase):
+
+    def test_unknown_forced_nodes_are_rejected(self):
+        with self.assertRaises(RuntimeError) as context:
+            restore_nodes({}, [[load_node('10.0.0.0/16')]], forced=['network', 'netwrok'])
+        self.assertIn('netwrok', str(context.exception))
+        self.assertNotIn('network,', str(context.exception))
+
+if __name__ == '__main__':
+    unittest.main()
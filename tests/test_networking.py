@@ -0,0 +1,55 @@
+import unittest
+from sky.state import config
+from sky.cache import describe_cache
+from sky import mock, networking
+
+ZONES = ['us-east-1a', 'us-east-1b', 'us-east-1c', 'us-east-1d']
+
+class CreateSubnetsTest(unittest.TestCase):
+
+    def setUp(self):
+        # Plan against the in-memory provider.
+        config.update(DRY_RUN=True, PROJECT_NAME='proj', ENVIRONMENT='staging')
+        mock.provider.__init__()
+        describe_cache.clear()
+        self.vpc = networking.create_network(network_class='b')
+
+    def test_subnets_fit_vpc(self):
+        # Plans that aren't a power of two used to get a netmask one bit too short.
+        for (zones, count, netmask) in [(3, 1, 18), (1, 5, 19), (3, 2, 19), (1, 7, 19)]:
+            with self.subTest(zones=zones, count=count):
+                self.setUp()
+                subnets = networking.create_subnets(self.vpc, zones=','.join(ZONES[:zones]), count=count)
+                self.assertEqual(self.vpc.cidr_block, '172.16.0.0/16')
+                self.assertEqual(len(subnets), zones*count)
+                self.assertEqual(set(subnet.cidr_block.split('/')[1] for subnet in subnets), set([str(netmask)]))
+
+    def test_subnets_fit_remaining_space(self):
+        # Later plans shrink their Subnets to fit the space left by earlier plans.
+        public_subnets = networking.create_subnets(self.vpc, zones=','.join(ZONES[:3]), public=True)
+        private_subnets = networking.create_subnets(self.vpc, zones=','.join(ZONES[:3]))
+        self.assertEqual(len(private_subnets), 3)
+        self.assertFalse(networking.find_overlaps([subnet.cidr_block for subnet in public_subnets + private_subnets]))
+
+    def test_failed_subnets_are_deleted(self):
+        # A Subnet that is created but can't be associated is deleted, along with every other resource of the call.
+        associate_route_table = mock.MockConnection._associate_route_table
+        associations = []
+        def fail_second(connection, route_table_id, subnet_id, **kwargs):
+            associations.append(subnet_id)
+            if len(associations) == 2:
+                raise RuntimeError('Association failed.')
+            return associate_route_table(connection, route_table_id, subnet_id, **kwargs)
+
+        mock.MockConnection._associate_route_table = fail_second
+        try:
+            with self.assertRaises(RuntimeError):
+                networking.create_subnets(self.vpc, zones=','.join(ZONES[:3]))
+        finally:
+            mock.MockConnection._associate_route_table = associate_route_table
+
+        self.assertEqual(mock.provider.find('subnet'), [])
+        self.assertEqual([route_table for route_table in mock.provider.find('route_table') if not getattr(route_table, 'main', False)], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from sky.rules import Rule, merge_port_ranges, compact_rules, apply_rules
+
+def tcp(from_port, to_port=None, cidr_ip='0.0.0.0/0', group_id=None):
+    return Rule('tcp', from_port, from_port if to_port is None else to_port, None if group_id else cidr_ip, group_id)
+
+class FakePermission(object):
+
+    def __init__(self, rule):
+        self.ip_protocol, self.from_port, self.to_port = rule.protocol, rule.from_port, rule.to_port
+        self.grants = [Rule(None, None, None, rule.cidr_ip, rule.group_id)]
+
+class FakeSecurityGroup(object):
+
+    def __init__(self, rules=(), rules_egress=()):
+        self.id, self.name = 'sg-1', 'gp-proj-staging'
+        self.rules = [FakePermission(rule) for rule in rules]
+        self.rules_egress = [FakePermission(rule) for rule in rules_egress]
+
+class FakeConnection(object):
+    # Records batched rule requests.
+
+    def __init__(self):
+        self.requests = []
+
+    def get_status(self, action, params, verb='GET'):
+        self.requests.append((action, params))
+        return True
+
+class MergePortRangesTest(unittest.TestCase):
+
+    def test_overlapping_and_contiguous_ranges_merge(self):
+        self.assertEqual(merge_port_ranges([tcp(80), tcp(81), tcp(8000, 8080), tcp(8050, 8100)]), [tcp(80, 81), tcp(8000, 8100)])
+
+    def test_ranges_of_other_targets_dont_merge(self):
+        rules = [tcp(80), tcp(81, cidr_ip='10.0.0.0/16'), tcp(82, group_id='sg-2'), Rule('udp', 81, 81, '0.0.0.0/0', None)]
+        self.assertEqual(sorted(merge_port_ranges(rules)), sorted(rules))
+
+    def test_gaps_are_kept(self):
+        self.assertEqual(merge_port_ranges([tcp(443), tcp(80)]), [tcp(80), tcp(443)])
+
+    def test_all_ports_are_left_alone(self):
+        rules = [Rule('-1', None, None, '0.0.0.0/0', None)]
+        self.assertEqual(merge_port_ranges(rules), rules)
+
+class CompactRulesTest(unittest.TestCase):
+
+    def test_duplicates_are_removed(self):
+        self.assertEqual(compact_rules([tcp(80), tcp(80)]), [tcp(80)])
+
+    def test_cidr_blocks_are_aggregated(self):
+        self.assertEqual(compact_rules([tcp(22, cidr_ip='10.0.0.0/24'), tcp(22, cidr_ip='10.0.1.0/24')]), [tcp(22, cidr_ip='10.0.0.0/23')])
+
+    def test_compaction_repeats_until_stable(self):
+        # Merging ports makes the permissions equal, which then lets their CIDR blocks aggregate.
+        rules = [tcp(80, cidr_ip='10.0.0.0/24'), tcp(81, cidr_ip='10.0.0.0/24'), tcp(80, 81, cidr_ip='10.0.1.0/24')]
+        self.assertEqual(compact_rules(rules), [tcp(80, 81, cidr_ip='10.0.0.0/23')])
+
+class ApplyRulesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection()
+
+    def test_equivalent_rules_are_unchanged(self):
+        # Existing rules that are split differently, but grant the same traffic, are neither revoked nor authorized.
+        security_group = FakeSecurityGroup(rules=[tcp(80), tcp(81)])
+        apply_rules(self.connection, security_group, [tcp(80, 81)], [], revoke=True)
+        self.assertEqual(self.connection.requests, [])
+
+    def test_unlisted_rules_are_kept(self):
+        security_group = FakeSecurityGroup(rules=[tcp(22, cidr_ip='10.0.0.0/8')])
+        apply_rules(self.connection, security_group, [tcp(80)], [])
+        self.assertEqual([action for (action, params) in self.connection.requests], ['AuthorizeSecurityGroupIngress'])
+
+    def test_unlisted_rules_are_revoked_on_request(self):
+        security_group = FakeSecurityGroup(rules_egress=[Rule('-1', None, None, '0.0.0.0/0', None)])
+        apply_rules(self.connection, security_group, [], [tcp(443)], revoke=True)
+        self.assertEqual(self.connection.requests, [('AuthorizeSecurityGroupEgress', {'GroupId': 'sg-1',
+                                                                                     'IpPermissions.1.IpProtocol': 'tcp',
+                                                                                     'IpPermissions.1.FromPort': 443,
+                                                                                     'IpPermissions.1.ToPort': 443,
+                                                                                     'IpPermissions.1.IpRanges.1.CidrIp': '0.0.0.0/0'}),
+                                                    ('RevokeSecurityGroupEgress', {'GroupId': 'sg-1',
+                                                                                   'IpPermissions.1.IpProtocol': '-1',
+                                                                                   'IpPermissions.1.IpRanges.1.CidrIp': '0.0.0.0/0'})])
+
+    def test_narrowed_rules_are_authorized_before_revocation(self):
+        # A rule that is revoked doesn't count towards the rules that it covers.
+        security_group = FakeSecurityGroup(rules=[tcp(80, 90)])
+        apply_rules(self.connection, security_group, [tcp(80, 85)], [], revoke=True)
+        self.assertEqual([action for (action, params) in self.connection.requests], ['AuthorizeSecurityGroupIngress', 'RevokeSecurityGroupIngress'])
+
+if __name__ == '__main__':
+    unittest.main()
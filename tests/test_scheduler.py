@@ -0,0 +1,95 @@
+import time
+import threading
+import unittest
+from sky.state import ready
+from sky.infrastructure import Infrastructure
+from sky.scheduler import execute
+from sky.main import build_dependency_graph
+
+def make_node(name, requires=None, function=None, log=None):
+    def build():
+        if log is not None:
+            log.append(name)
+        if function:
+            function()
+    build.__name__ = name
+    return Infrastructure(build, requires=requires)
+
+def fail(message):
+    def function():
+        raise RuntimeError(message)
+    return function
+
+class BuildDependencyGraphTest(unittest.TestCase):
+
+    def get_layers(self, nodes):
+        return [sorted(node.__name__ for node in layer) for layer in build_dependency_graph(nodes)]
+
+    def test_nodes_are_layered_by_dependencies(self):
+        nodes = [make_node('app', requires=['subnets', 'database']), make_node('database', requires=['subnets']),
+                 make_node('subnets', requires=['vpc']), make_node('vpc'), make_node('bucket')]
+        self.assertEqual(self.get_layers(nodes), [['bucket', 'vpc'], ['subnets'], ['database'], ['app']])
+
+    def test_undefined_dependencies_are_rejected(self):
+        with self.assertRaisesRegex(RuntimeError, r'\(app\) requires undefined infrastructure \(database\)'):
+            build_dependency_graph([make_node('app', requires=['database'])])
+
+    def test_cycles_are_reported(self):
+        # The reported path follows the cycle, but not the node that merely depends on it.
+        nodes = [make_node('vpc'), make_node('a', requires=['vpc', 'c']), make_node('b', requires=['a']),
+                 make_node('c', requires=['b']), make_node('app', requires=['c'])]
+        with self.assertRaises(RuntimeError) as context:
+            build_dependency_graph(nodes)
+        path = str(context.exception).split('(', 1)[1].rstrip(').').split(' -> ')
+        self.assertEqual(path[0], path[-1])
+        self.assertEqual(sorted(path[:-1]), ['a', 'b', 'c'])
+        for (name, dependency) in zip(path, path[1:]):
+            self.assertIn(dependency, {'a': ['c'], 'b': ['a'], 'c': ['b']}[name])
+
+class ExecuteTest(unittest.TestCase):
+
+    def setUp(self):
+        ready.clear()
+
+    def tearDown(self):
+        ready.clear()
+
+    def test_nodes_start_after_their_dependencies(self):
+        nodes = [make_node('vpc'), make_node('subnets', requires=['vpc']), make_node('bucket'),
+                 make_node('database', requires=['subnets']), make_node('app', requires=['database', 'bucket'])]
+        timings = execute(nodes, jobs=4)
+        for node in nodes:
+            for dependency in node.dependencies or ():
+                self.assertGreaterEqual(timings[node.__name__][0], timings[dependency][1])
+        self.assertEqual(sorted(ready), sorted(node.__name__ for node in nodes))
+
+    def test_independent_nodes_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        execute([make_node('a', function=barrier.wait), make_node('b', function=barrier.wait)], jobs=2)
+
+    def test_dependencies_outside_the_nodes_are_considered_built(self):
+        log = []
+        execute([make_node('app', requires=['vpc'], log=log)])
+        self.assertEqual(log, ['app'])
+
+    def test_no_nodes_start_after_a_failure(self):
+        # The slow node finishes, but neither the failed node's dependents nor the slow node's dependents start.
+        log = []
+        nodes = [make_node('broken', function=fail('broken'), log=log), make_node('slow', function=lambda: time.sleep(0.2), log=log),
+                 make_node('after_broken', requires=['broken'], log=log), make_node('after_slow', requires=['slow'], log=log)]
+        with self.assertRaisesRegex(RuntimeError, 'broken'):
+            execute(nodes, jobs=2)
+        self.assertEqual(sorted(log), ['broken', 'slow'])
+        self.assertIn('slow', ready)
+        self.assertNotIn('broken', ready)
+
+    def test_first_failure_is_raised(self):
+        def fail_later():
+            time.sleep(0.2)
+            raise RuntimeError('second')
+        nodes = [make_node('first', function=fail('first')), make_node('second', function=fail_later)]
+        with self.assertRaisesRegex(RuntimeError, '^first$'):
+            execute(nodes, jobs=2)
+
+if __name__ == '__main__':
+    unittest.main()
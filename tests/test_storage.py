@@ -0,0 +1,36 @@
+import json
+import unittest
+from sky.state import config
+from sky.cache import describe_cache
+from sky import mock, storage
+
+class BucketPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        # Plan against the in-memory provider.
+        config.update(DRY_RUN=True, PROJECT_NAME='proj', ENVIRONMENT='staging')
+        mock.provider.__init__()
+        describe_cache.clear()
+        self.bucket = storage.connect_s3().create_bucket('s3-proj-staging')
+        for key_name in ['static/secret.txt', 'static/img.png'] + ['static/img/%02d.png' % index for index in range(10)] + ['static/images/logo.png']:
+            self.bucket.new_key(key_name).set_contents_from_string('')
+
+    def get_resources(self, prefix, max_resources):
+        policy = json.loads(storage.get_bucket_policy(self.bucket, prefix=prefix, max_resources=max_resources))
+        return [resource.split('/', 1)[1] for resource in policy['Statement'][0]['Resource']]
+
+    def test_small_directories_are_listed(self):
+        self.assertEqual(self.get_resources('static/img/', 20), ['static/img/%02d.png' % index for index in range(10)])
+
+    def test_large_directories_collapse(self):
+        self.assertEqual(self.get_resources('static/', 5), ['static/images/logo.png', 'static/img.png', 'static/img/*', 'static/secret.txt'])
+
+    def test_wildcards_are_clamped_to_prefix(self):
+        # A prefix without a trailing slash must not widen into its parent directory (which holds static/secret.txt).
+        self.assertEqual(self.get_resources('static/img', 1), ['static/img*'])
+        self.assertEqual(self.get_resources('static/img/', 1), ['static/img/*'])
+        self.assertEqual(storage.get_policy_resources(['a/b/0', 'a/bc/0'], max_resources=1, prefix='a/b'), ['a/b*'])
+        self.assertEqual(storage.get_policy_resources(['a/b/0', 'a/bc/0'], max_resources=1, prefix='a'), ['a/*'])
+
+if __name__ == '__main__':
+    unittest.main()